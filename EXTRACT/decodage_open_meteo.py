@@ -0,0 +1,115 @@
+import re
+import json
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+    _charger_json = orjson.loads
+except ImportError:
+    _charger_json = json.loads
+
+_DEBUT_HOURLY = re.compile(rb'"hourly"\s*:\s*\{')
+
+
+def _tableau(contenu, debut_bloc, fin_bloc, nom):
+    """Positions [début, fin[ du texte entre crochets de "nom":[...] dans le bloc hourly (ou None)."""
+    m = re.compile(rb'"' + re.escape(nom.encode()) + rb'"\s*:\s*\[').search(contenu, debut_bloc, fin_bloc)
+    if m is None:
+        return None
+    return m.end(), contenu.index(b"]", m.end())
+
+
+def _horodatage(texte):
+    """Horodatage ISO ("2024-01-01T00:00") ou unixtime (timeformat=unixtime) en datetime64[s]."""
+    texte = texte.strip(b' "').decode()
+    if texte.isdigit():
+        return np.datetime64(int(texte), "s")
+    return np.datetime64(texte, "s")
+
+
+def _decoder_bloc(contenu, debut_bloc, fin_bloc, variables):
+    """Décode un bloc "hourly":{...} : séries float32 + axe du temps déduit du début et du pas."""
+    positions_temps = _tableau(contenu, debut_bloc, fin_bloc, "time")
+    if positions_temps is None:
+        return None
+    a, b = positions_temps
+    # Seuls les deux premiers horodatages sont lus : le pas est constant
+    premiers = [_horodatage(t) for t in contenu[a:min(b, a + 64)].split(b",", 2)[:2]]
+    debut = premiers[0]
+    pas = premiers[1] - debut if len(premiers) > 1 else np.timedelta64(3600, "s")
+
+    valeurs = {}
+    n = None
+    for v in variables:
+        positions = _tableau(contenu, debut_bloc, fin_bloc, v)
+        if positions is None:
+            continue
+        texte = contenu[positions[0]:positions[1]].replace(b"null", b"nan")
+        # Analyse directe du texte en float32, sans liste Python intermédiaire
+        valeurs[v] = np.fromstring(texte.decode("ascii"), dtype=np.float32, sep=",") if texte.strip() \
+            else np.empty(0, dtype=np.float32)
+        if n is not None and len(valeurs[v]) != n:
+            raise ValueError(f"Longueurs incohérentes pour {v}")
+        n = len(valeurs[v])
+
+    if n is None:
+        # aucune variable : on compte les horodatages
+        n = contenu.count(b",", a, b) + 1 if contenu[a:b].strip() else 0
+    temps = debut + np.arange(n) * pas
+    return {"time": temps, **valeurs}
+
+
+def decoder_hourly(contenu, variables):
+    """
+    Décode la section "hourly" d'une réponse Open-Meteo (un point ou une liste de points).
+
+    Les tableaux de valeurs sont analysés directement depuis les octets de la réponse en float32 ;
+    l'axe du temps est calculé à partir du premier horodatage et du pas, sans analyser chaque chaîne.
+    En cas de format inattendu, repli sur un décodage JSON classique (orjson si disponible).
+
+    :param contenu: corps brut de la réponse (bytes, ex : resp.content)
+    :param variables: variables horaires à extraire
+    :return: liste de dicts {"time": datetime64[], variable: float32[]} (un par point, vide si pas de hourly)
+    """
+    try:
+        blocs = []
+        position = 0
+        while True:
+            m = _DEBUT_HOURLY.search(contenu, position)
+            if m is None:
+                break
+            debut_bloc = m.end()
+            # les tableaux ne contiennent pas d'accolade : la première "}" ferme le bloc
+            fin_bloc = contenu.index(b"}", debut_bloc)
+            bloc = _decoder_bloc(contenu, debut_bloc, fin_bloc, variables)
+            if bloc is not None:
+                blocs.append(bloc)
+            position = fin_bloc
+        return blocs
+    except (ValueError, IndexError):
+        return _decoder_json(contenu, variables)
+
+
+def _decoder_json(contenu, variables):
+    """Décodage de repli via le parseur JSON."""
+    data = _charger_json(contenu)
+    if isinstance(data, dict):
+        data = [data]
+    blocs = []
+    for d in data:
+        hourly = d.get("hourly")
+        if not hourly:
+            continue
+        bloc = {"time": pd.to_datetime(hourly["time"]).values}
+        for v in variables:
+            if v in hourly:
+                bloc[v] = np.array(hourly[v], dtype=np.float32)
+        blocs.append(bloc)
+    return blocs
+
+
+def vers_dataframe(bloc):
+    """DataFrame construit directement depuis les tableaux NumPy (time + variables)."""
+    return pd.DataFrame(bloc, copy=False)
@@ -1,4 +1,29 @@
+import os
+import json
 import requests
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+    _charger_json = orjson.loads
+except ImportError:
+    _charger_json = json.loads
+
+# Taille des lots de records (mode export) et des pages (mode /records, limite de l'API : 100)
+TAILLE_LOT = 50_000
+TAILLE_PAGE = 100
+
+# Types de champs OpenDataSoft (fields[].type du catalogue) → noms de types pyarrow ;
+# les types absents (geo_shape, json, file...) sont écrits en texte JSON
+TYPES_ODS = {
+    "text": "string",
+    "int": "int64",
+    "double": "float64",
+    "boolean": "bool_",
+    "date": "date32",
+    "datetime": "timestamp",
+    "geo_point_2d": "geo_point_2d",
+}
 
 def query_opendatasoft(domain: str,
                         dataset_id: str,
@@ -42,6 +67,251 @@ def query_opendatasoft(domain: str,
     resp.raise_for_status()
     return resp.json()
 
+def _params_odsql(select=None, where=None, group_by=None, order_by=None):
+    params = {}
+    if select:
+        params["select"] = select
+    if where:
+        params["where"] = where
+    if group_by:
+        params["group_by"] = group_by
+    if order_by:
+        params["order_by"] = order_by
+    return params
+
+
+def schema_opendatasoft(domain: str, dataset_id: str, colonnes=None, apikey: str = None):
+    """
+    Construit le pyarrow.Schema d'un dataset à partir des types déclarés dans le catalogue
+    (GET /catalog/datasets/{dataset_id} → fields[].type), avant toute lecture des records.
+
+    Args:
+        colonnes: noms des champs à garder, dans cet ordre (optionnel, tous les champs par défaut).
+    Returns:
+        pyarrow.Schema (ValueError si une colonne demandée n'est pas un champ du dataset)
+    """
+    import pyarrow as pa
+
+    url = f"https://{domain}/api/explore/v2.1/catalog/datasets/{dataset_id}"
+    headers = {"Authorization": f"Apikey {apikey}"} if apikey else {}
+    resp = requests.get(url, headers=headers)
+    resp.raise_for_status()
+    types = {f["name"]: f.get("type") for f in resp.json().get("fields", [])}
+
+    if colonnes is None:
+        colonnes = list(types)
+    inconnues = [c for c in colonnes if c not in types]
+    if inconnues:
+        raise ValueError(f"Champs absents du dataset {dataset_id} : {inconnues} (fournir un schéma explicite)")
+
+    champs = []
+    for nom in colonnes:
+        type_arrow = TYPES_ODS.get(types[nom], "string")
+        if type_arrow == "timestamp":
+            type_arrow = pa.timestamp("us", tz="UTC")
+        elif type_arrow == "geo_point_2d":
+            type_arrow = pa.struct([("lon", pa.float64()), ("lat", pa.float64())])
+        else:
+            type_arrow = getattr(pa, type_arrow)()
+        champs.append(pa.field(nom, type_arrow))
+    return pa.schema(champs)
+
+
+def exporter_opendatasoft(domain: str,
+                          dataset_id: str,
+                          select: str = None,
+                          where: str = None,
+                          order_by: str = None,
+                          apikey: str = None,
+                          taille_lot: int = TAILLE_LOT,
+                          schema=None):
+    """
+    Lit un dataset complet via l'endpoint /exports/jsonl en streaming.
+
+    La réponse est lue par morceaux et analysée ligne à ligne ; les records sont regroupés en
+    lots typés (pyarrow.RecordBatch) de taille_lot lignes. La mémoire reste bornée par un lot,
+    quelle que soit la taille du dataset.
+
+    Tous les lots ont le même schéma, fixé avant la lecture : aucun type n'est déduit des records,
+    un lot sans valeur ou avec des entiers dans une colonne double garde donc les types déclarés.
+
+    Args:
+        domain, dataset_id, select, where, order_by, apikey: comme query_opendatasoft.
+        taille_lot: nombre de records par lot.
+        schema: pyarrow.Schema des lots. Par défaut, schema_opendatasoft (types du catalogue), restreint
+            aux colonnes de select ; un select avec expressions ou alias demande un schéma explicite.
+    Yields:
+        pyarrow.RecordBatch (une valeur qui ne rentre pas dans le schéma lève ValueError, jamais de troncature)
+    """
+    import pyarrow as pa
+
+    if schema is None:
+        colonnes = [c.strip() for c in select.split(",")] if select else None
+        schema = schema_opendatasoft(domain, dataset_id, colonnes=colonnes, apikey=apikey)
+
+    url = f"https://{domain}/api/explore/v2.1/catalog/datasets/{dataset_id}/exports/jsonl"
+    params = _params_odsql(select=select, where=where, order_by=order_by)
+    headers = {"Authorization": f"Apikey {apikey}"} if apikey else {}
+
+    with requests.get(url, params=params, headers=headers, stream=True) as resp:
+        resp.raise_for_status()
+        lot = []
+        for ligne in resp.iter_lines(chunk_size=1 << 20):
+            if not ligne:
+                continue
+            lot.append(_charger_json(ligne))
+            if len(lot) >= taille_lot:
+                yield _vers_batch(pa, lot, schema)
+                lot = []
+        if lot:
+            yield _vers_batch(pa, lot, schema)
+
+
+def _vers_batch(pa, records, schema):
+    """
+    Convertit une liste de dicts en RecordBatch du schéma donné, colonne par colonne, sans déduire de type.
+    Les dates et horodatages (chaînes ISO) sont analysés par cast ; les objets (geo_shape, json) d'une colonne
+    texte sont sérialisés en JSON. Une valeur qui ne rentre pas (ex : 2.5 en int64) lève ValueError.
+    """
+    inconnues = set().union(*records) - set(schema.names)
+    if inconnues:
+        raise ValueError(f"Colonnes absentes du schéma : {sorted(inconnues)}")
+    colonnes = []
+    for champ in schema:
+        valeurs = [r.get(champ.name) for r in records]
+        try:
+            if pa.types.is_string(champ.type):
+                valeurs = [v if v is None or isinstance(v, str) else json.dumps(v) if isinstance(v, (dict, list))
+                           else str(v) for v in valeurs]
+                colonnes.append(pa.array(valeurs, type=champ.type))
+            elif pa.types.is_temporal(champ.type):
+                colonnes.append(pa.array(valeurs, type=pa.string()).cast(champ.type))
+            else:
+                # pa.array(valeurs, type=int64) tronquerait 2.5 en 2 : conversion puis cast sûr
+                colonnes.append(pa.array(valeurs).cast(champ.type, safe=True))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError) as e:
+            raise ValueError(f"Colonne '{champ.name}' : valeurs incompatibles avec {champ.type} ({e})") from e
+    return pa.RecordBatch.from_arrays(colonnes, schema=schema)
+
+
+def _caster(pa, batch, schema):
+    """Cast sûr d'un lot vers un schéma : une valeur qui ne rentre pas (ex : 1.5 en int64) lève ValueError."""
+    inconnues = set(batch.schema.names) - set(schema.names)
+    if inconnues:
+        raise ValueError(f"Colonnes absentes du schéma : {sorted(inconnues)}")
+    colonnes = []
+    for champ in schema:
+        if champ.name not in batch.schema.names:
+            colonnes.append(pa.nulls(batch.num_rows, type=champ.type))
+            continue
+        colonne = batch.column(champ.name)
+        try:
+            colonnes.append(colonne.cast(champ.type, safe=True))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError) as e:
+            raise ValueError(f"Colonne '{champ.name}' : {colonne.type} incompatible avec {champ.type} ({e})") from e
+    return pa.RecordBatch.from_arrays(colonnes, schema=schema)
+
+
+def telecharger_export_parquet(domain: str, dataset_id: str, chemin: str, where: str = None, apikey: str = None):
+    """
+    Télécharge l'export /exports/parquet directement sur disque (flux binaire par blocs de 1 Mo).
+    """
+    url = f"https://{domain}/api/explore/v2.1/catalog/datasets/{dataset_id}/exports/parquet"
+    headers = {"Authorization": f"Apikey {apikey}"} if apikey else {}
+    with requests.get(url, params=_params_odsql(where=where), headers=headers, stream=True) as resp:
+        resp.raise_for_status()
+        with open(chemin, "wb") as f:
+            for bloc in resp.iter_content(chunk_size=1 << 20):
+                f.write(bloc)
+    return chemin
+
+
+def query_opendatasoft_parallele(domain: str,
+                                 dataset_id: str,
+                                 select: str = None,
+                                 where: str = None,
+                                 order_by: str = None,
+                                 apikey: str = None,
+                                 taille_page: int = TAILLE_PAGE,
+                                 nb_threads: int = 8,
+                                 maximum: int = 10_000):
+    """
+    Parcourt l'endpoint /records par fenêtres d'offset téléchargées en parallèle.
+    Les pages sont des listes de dicts non typées : pour les écrire avec ecrire_parquet, lui passer
+    schema_opendatasoft(...) (ou préférer telecharger_export_parquet, dont le fichier porte le schéma du dataset).
+
+    order_by est obligatoire : sans tri, les fenêtres d'offset ne sont pas stables d'une requête à l'autre
+    (lignes dupliquées ou sautées). Il doit désigner une clé unique (ex : "id" ou "date, station").
+
+    Au plus 2 × nb_threads pages sont en vol ; les pages sont rendues dans l'ordre des offsets.
+    L'API limite offset + limit à 10 000 : au-delà, utiliser exporter_opendatasoft.
+
+    Yields:
+        la liste "results" de chaque page
+    """
+    if not order_by:
+        raise ValueError("order_by obligatoire pour paginer par offset (clé unique, ex : order_by=\"id\")")
+    total = query_opendatasoft(domain, dataset_id, select=select, where=where, limit=0,
+                               apikey=apikey).get("total_count", 0)
+    offsets = iter(range(0, min(total, maximum), taille_page))
+
+    def page(offset):
+        return query_opendatasoft(domain, dataset_id, select=select, where=where, order_by=order_by,
+                                  limit=taille_page, offset=offset, apikey=apikey).get("results", [])
+
+    with ThreadPoolExecutor(max_workers=nb_threads) as pool:
+        en_vol = [pool.submit(page, o) for _, o in zip(range(2 * nb_threads), offsets)]
+        while en_vol:
+            resultats = en_vol.pop(0).result()
+            suivant = next(offsets, None)
+            if suivant is not None:
+                en_vol.append(pool.submit(page, suivant))
+            yield resultats
+
+
+def ecrire_parquet(lots, chemin, schema):
+    """
+    Écrit des lots (RecordBatch ou listes de dicts) dans un fichier Parquet, lot par lot.
+
+    Le schéma du fichier est fixé d'avance (ex : schema_opendatasoft, le même que celui passé à
+    exporter_opendatasoft) ; il ne dépend donc pas du contenu du premier lot. Chaque lot y est converti
+    sans troncature : une valeur qui ne rentre pas lève ValueError et le fichier partiel est supprimé.
+    Pour un export tabulaire complet, telecharger_export_parquet fournit directement le schéma réel.
+
+    Args:
+        schema: pyarrow.Schema du fichier.
+    Returns:
+        le nombre de lignes écrites
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer, n = None, 0
+    try:
+        for lot in lots:
+            if not isinstance(lot, pa.RecordBatch):
+                if not lot:
+                    continue
+                lot = _vers_batch(pa, lot, schema)
+            else:
+                lot = _caster(pa, lot, schema)
+            if writer is None:
+                writer = pq.ParquetWriter(chemin, schema)
+            writer.write_batch(lot)
+            n += lot.num_rows
+    except Exception:
+        # pas de fichier Parquet partiel laissé derrière une erreur
+        if writer is not None:
+            writer.close()
+            writer = None
+            os.remove(chemin)
+        raise
+    finally:
+        if writer is not None:
+            writer.close()
+    return n
+
+
 if __name__ == "__main__":
     # Exemple avec un dataset public
     domain = "public.opendatasoft.com"
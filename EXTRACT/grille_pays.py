@@ -0,0 +1,169 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+from decodage_open_meteo import decoder_hourly
+
+
+# Boîtes englobantes des pays (country, lat_min, lat_max, lon_min, lon_max)
+chemin_bbox = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pays_europe_bbox.csv")
+
+# Pas de la grille en degrés et nombre de points par requête Open-Meteo
+PAS_GRILLE = 0.5
+TAILLE_LOT = 50
+
+
+def charger_bbox(chemin=chemin_bbox, pays=None):
+    """
+    Charge les boîtes englobantes des pays.
+
+    :param chemin: CSV country, lat_min, lat_max, lon_min, lon_max
+    :param pays: liste de pays à garder (par défaut : tous)
+    :return: DataFrame indexé par pays
+    """
+    bbox = pd.read_csv(chemin).set_index("country")
+    if pays is not None:
+        bbox = bbox.loc[list(pays)]
+    return bbox
+
+
+def charger_population(chemin):
+    """
+    Charge une grille de population (CSV latitude, longitude, population), ex : export GPW/GHS-POP
+    rééchantillonné au pas de la grille. Sert à la pondération par population.
+    """
+    pop = pd.read_csv(chemin)
+    return pop[["latitude", "longitude", "population"]]
+
+
+def grille_pays(bbox, pas=PAS_GRILLE, population=None):
+    """
+    Échantillonne chaque pays sur une grille régulière (centres des cellules de sa boîte englobante).
+    Un pays plus petit que le pas a toujours au moins un point.
+
+    Poids : surface de la cellule (∝ cos(latitude)), ou population de la cellule si une grille de
+    population est fournie (cellule la plus proche au pas de la grille).
+
+    :param bbox: DataFrame renvoyé par charger_bbox
+    :param pas: pas de la grille en degrés
+    :param population: DataFrame renvoyé par charger_population (optionnel)
+    :return: DataFrame country, latitude, longitude, poids
+    """
+    morceaux = []
+    for pays, b in bbox.iterrows():
+        n_lat = max(1, int(round((b.lat_max - b.lat_min) / pas)))
+        n_lon = max(1, int(round((b.lon_max - b.lon_min) / pas)))
+        lats = b.lat_min + (np.arange(n_lat) + 0.5) * (b.lat_max - b.lat_min) / n_lat
+        lons = b.lon_min + (np.arange(n_lon) + 0.5) * (b.lon_max - b.lon_min) / n_lon
+        lat, lon = np.meshgrid(lats, lons, indexing="ij")
+        surface = np.cos(np.radians(lat)) * (b.lat_max - b.lat_min) / n_lat * (b.lon_max - b.lon_min) / n_lon
+        morceaux.append(pd.DataFrame({
+            "country": pays,
+            "latitude": lat.ravel().round(4),
+            "longitude": lon.ravel().round(4),
+            "poids": surface.ravel(),
+        }))
+    points = pd.concat(morceaux, ignore_index=True)
+
+    if population is not None:
+        cellule = lambda df: pd.MultiIndex.from_arrays([np.round(df.latitude.to_numpy() / pas).astype(int),
+                                                        np.round(df.longitude.to_numpy() / pas).astype(int)])
+        pop = population["population"].groupby(cellule(population)).sum()
+        poids_pop = pop.reindex(cellule(points)).to_numpy()
+        # cellules sans population connue : poids nul (ex : mer dans la boîte englobante)
+        points["poids"] = np.nan_to_num(poids_pop, nan=0.0)
+
+    return points
+
+
+def recuperer_grille(url, variables, start_date, end_date, points, variables_max=(), taille_lot=TAILLE_LOT,
+                     pause=1, limiteur=None):
+    """
+    Récupère des séries horaires Open-Meteo pour tous les points de la grille par lots
+    (une requête = taille_lot coordonnées) et calcule la moyenne pondérée par pays.
+
+    Les sommes pondérées sont accumulées lot par lot (produit matriciel pays × points),
+    la mémoire reste donc proportionnelle à nb_pays × nb_heures, pas au nombre de points.
+
+    :param url: endpoint Open-Meteo (archive ou air-quality)
+    :param variables: variables horaires
+    :param start_date: date de début (YYYY-MM-DD)
+    :param end_date: date de fin (YYYY-MM-DD)
+    :param points: DataFrame renvoyé par grille_pays
+    :param variables_max: variables catégorielles agrégées par maximum au lieu de la moyenne
+                          (ex : weathercode, comme le code journalier d'Open-Meteo qui garde le plus sévère)
+    :param taille_lot: nombre de points par requête
+    :param pause: pause entre deux requêtes (secondes), ignorée si un limiteur est fourni
+    :param limiteur: objet partagé qui cadence les requêtes (méthodes attendre() avant chaque requête et
+                     ralentir() sur HTTP 429, ex : planificateur_backfill.Limiteur) ; le lot refusé est alors retenté
+    :return: DataFrame horaire time, <variables>, country
+    """
+    variables_max = list(variables_max)
+    pays = pd.Index(points["country"].unique())
+    code_pays = pays.get_indexer(points["country"])
+    sommes = None  # (variables, pays, heures)
+    poids_totaux = None
+    maxima = None  # (variables_max, pays, heures)
+    temps = None
+
+    for debut in range(0, len(points), taille_lot):
+        lot = points.iloc[debut:debut + taille_lot]
+        params = {
+            "latitude": ",".join(map(str, lot.latitude)),
+            "longitude": ",".join(map(str, lot.longitude)),
+            "start_date": start_date,
+            "end_date": end_date,
+            "hourly": ",".join(variables + variables_max),
+        }
+        while True:
+            if limiteur is not None:
+                limiteur.attendre()
+            resp = requests.get(url, params=params)
+            if resp.status_code == 429 and limiteur is not None:
+                limiteur.ralentir()
+                continue
+            break
+        resp.raise_for_status()
+        blocs = decoder_hourly(resp.content, variables + variables_max)
+        if len(blocs) != len(lot):
+            raise ValueError(f"Réponse Open-Meteo incomplète : {len(blocs)} points sur {len(lot)}")
+
+        if temps is None:
+            temps = blocs[0]["time"]
+            sommes = np.zeros((len(variables), len(pays), len(temps)))
+            poids_totaux = np.zeros_like(sommes)
+            maxima = np.full((len(variables_max), len(pays), len(temps)), np.nan)
+
+        # Matrice d'appartenance pondérée (pays × points du lot)
+        appartenance = np.zeros((len(pays), len(lot)))
+        appartenance[code_pays[debut:debut + len(lot)], np.arange(len(lot))] = lot["poids"].to_numpy()
+
+        for k, v in enumerate(variables):
+            valeurs = np.stack([b[v] for b in blocs]).astype(float)  # (points, heures)
+            valide = ~np.isnan(valeurs)
+            sommes[k] += appartenance @ np.where(valide, valeurs, 0.0)
+            poids_totaux[k] += appartenance @ valide
+
+        for k, v in enumerate(variables_max):
+            valeurs = np.stack([b[v] for b in blocs]).astype(float)
+            np.fmax.at(maxima[k], code_pays[debut:debut + len(lot)], valeurs)
+
+        print(f"   Lot {debut // taille_lot + 1}/{-(-len(points) // taille_lot)} ({len(lot)} points)")
+        if limiteur is None:
+            time.sleep(pause)
+
+    if temps is None:
+        return pd.DataFrame()
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        moyennes = sommes / poids_totaux
+
+    return pd.DataFrame({
+        "time": np.tile(temps, len(pays)),
+        **{v: moyennes[k].ravel() for k, v in enumerate(variables)},
+        **{v: maxima[k].ravel() for k, v in enumerate(variables_max)},
+        "country": np.repeat(pays.to_numpy(), len(temps)),
+    })
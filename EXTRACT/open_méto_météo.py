@@ -1,8 +1,20 @@
+import os
 import requests
-import pandas as pd
 import time
+import sys
 from datetime import datetime
 
+from grille_pays import charger_bbox, grille_pays, recuperer_grille
+from decodage_open_meteo import decoder_hourly, vers_dataframe
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TRANSFORM"))
+from cube_horaire import CubeHoraire, dossier_cubes
+from echange_arrow import EcrivainIPC, ecrire_ipc
+from agregation_parallele import agreger_ipc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "UTILS"))
+from profilage import profileur_depuis_env
+
 
 countries = {
     "Albania": (41.3275, 19.8189),
@@ -68,12 +80,51 @@ current_year = datetime.now().year
 today = datetime.now().strftime("%Y-%m-%d")
 years = [2023, 2024, current_year]
 
-# Liste pour stocker les DataFrames
-all_data = []
+# Mode d'extraction : "capitale" (un point par pays) ou "grille" (grille régulière, moyenne pondérée par pays)
+mode = os.getenv("MODE_EXTRACTION", "capitale")
+
+
+# Mesure des étapes (réseau, JSON, DataFrame, dates, agrégation, écriture)
+profileur = profileur_depuis_env("europe_weather")
+
+# Cube binaire horaire (pays × heure × variable) alimenté au fil de l'extraction
+cube = CubeHoraire(os.path.join(dossier_cubes, "europe_weather"), variables=variables, origine=f"{years[0]}-01-01")
+
+# Séries horaires émises en lots Arrow (schéma europe_weather_horaire) pour les étapes suivantes
+flux_horaire = EcrivainIPC("europe_weather_horaire")
 
 # --- Boucle de Récupération des Données ---
 
-for country, coords in countries.items():
+if mode == "grille":
+    points = grille_pays(charger_bbox(pays=countries))
+    print(f"Grille : {len(points)} points pour {len(countries)} pays")
+    for year in years:
+        start_date = f"{year}-01-01"
+        end_date = today if year == current_year else f"{year}-12-31"
+        print(f"Fetching weather grid for {year} ...")
+        try:
+            # weathercode : code le plus sévère de la grille (pas de moyenne pour une variable catégorielle)
+            with profileur.etape("grille") as m:
+                df = recuperer_grille("https://archive-api.open-meteo.com/v1/archive",
+                                      ["temperature_2m", "cloudcover"], start_date, end_date, points,
+                                      variables_max=["weathercode"])
+                m.lignes = len(df)
+            if df.empty:
+                print(f"Aucune donnée horaire disponible en {year}")
+                continue
+            df["year"] = year
+            df["weather_description"] = df["weathercode"].map(weathercode_mapping)
+            with profileur.etape("arrow", lignes=len(df)):
+                flux_horaire.ecrire(df)
+            with profileur.etape("cube", lignes=len(df)):
+                for pays, df_pays in df.groupby("country"):
+                    cube.ecrire(pays, df_pays["time"], df_pays[variables])
+        except requests.exceptions.HTTPError as e:
+            print(f"Erreur HTTP pour la grille en {year}: {e}")
+        except Exception as e:
+            print(f"Erreur inattendue pour la grille en {year}: {e}")
+
+for country, coords in (countries.items() if mode == "capitale" else []):
     lat, lon = coords
 
     for year in years:
@@ -90,17 +141,21 @@ for country, coords in countries.items():
         print(f"Fetching weather for {country} in {year} ...")
 
         try:
-            resp = requests.get(url)
-            resp.raise_for_status()
-            data = resp.json()
-
-            if "hourly" not in data or not data["hourly"]:
+            with profileur.etape("requete"):
+                resp = requests.get(url)
+                resp.raise_for_status()
+            # Décodage direct des octets de la réponse en tableaux float32 (temps calculé depuis début + pas)
+            with profileur.etape("decodage"):
+                blocs = decoder_hourly(resp.content, variables)
+
+            if not blocs or len(blocs[0]["time"]) == 0:
                 print(f"Aucune donnée horaire disponible pour {country} en {year}")
                 continue
 
             # Créer un DataFrame
-            df = pd.DataFrame(data["hourly"])
-            df["time"] = pd.to_datetime(df["time"])
+            with profileur.etape("dataframe") as m:
+                df = vers_dataframe(blocs[0])
+                m.lignes = len(df)
             df["country"] = country
             df["year"] = year
 
@@ -108,9 +163,12 @@ for country, coords in countries.items():
             if "weathercode" in df.columns:
                 df["weather_description"] = df["weathercode"].map(weathercode_mapping)
 
-            all_data.append(df)
+            with profileur.etape("arrow", lignes=len(df)):
+                flux_horaire.ecrire(df)
+            with profileur.etape("cube", lignes=len(df)):
+                cube.ecrire(country, df["time"], df[variables])
 
-            time.sleep(1)  I
+            time.sleep(1)
 
         except requests.exceptions.HTTPError as e:
             print(f"Erreur HTTP pour {country} en {year}: {e}")
@@ -118,26 +176,22 @@ for country, coords in countries.items():
             print(f"Erreur inattendue pour {country} en {year}: {e}")
 
 
-if all_data:
-    df_all = pd.concat(all_data, ignore_index=True)
-    df_all['month'] = df_all['time'].dt.to_period('M')
+flux_horaire.fermer()
 
+if flux_horaire.lignes:
+    # Moyennes mensuelles et mode de la description du temps, calculés sur le fichier Arrow horaire
+    # (mappé en mémoire, sommes en float64)
+    with profileur.etape("agregation", lignes=flux_horaire.lignes):
+        monthly_avg = agreger_ipc("europe_weather_horaire", variables=["temperature_2m", "cloudcover"],
+                                  frequence="M", colonnes_mode=["weather_description"])
 
-    monthly_avg = df_all.groupby(['country', 'year', 'month'])[[
-        "temperature_2m", "cloudcover"
-    ]].mean().reset_index()
-
-    # Déterminer le mode (valeur la plus fréquente) de la description du temps par mois
-    weather_mode = df_all.groupby(['country', 'year', 'month'])['weather_description'].agg(
-        lambda x: x.mode()[0] if not x.mode().empty else None
-    ).reset_index(name='weather_description_mode')
-
-    monthly_avg = monthly_avg.merge(weather_mode, on=['country', 'year', 'month'])
-
-    monthly_avg['month'] = monthly_avg['month'].astype(str)
-
-    monthly_avg.to_csv("europe_weather_monthly_avg.csv", index=False)
+    with profileur.etape("ecriture_csv", lignes=len(monthly_avg)):
+        monthly_avg.to_csv("europe_weather_monthly_avg.csv", index=False)
+    with profileur.etape("ecriture_arrow", lignes=len(monthly_avg)):
+        ecrire_ipc(monthly_avg, "europe_weather_monthly_avg")
     print("\n✅ Fichier CSV météo sauvegardé avec les moyennes mensuelles : europe_weather_monthly_avg.csv")
 
 else:
-    print("\n❌ Aucune donnée météo récupérée pour traitement.")
\ No newline at end of file
+    print("\n❌ Aucune donnée météo récupérée pour traitement.")
+
+profileur.rapport()
@@ -1,86 +1,29 @@
 import os
+import sys
 import requests
 import pandas as pd
 from datetime import datetime
 import time
 
-# Mapping des codes pays vers leurs IDs OpenAQ
-COUNTRY_IDS = {
-    "FR": 71,  # France
-    "GH": 152,  # Ghana
-    "IN": 9,  # India
-    "US": 219,  # United States
-    "GB": 223,  # United Kingdom
-    "DE": 49,  # Germany
-    "ES": 67,  # Spain
-    "IT": 98,  # Italy
-    "CN": 45,  # China
-    "JP": 103,  # Japan
-}
-
-# IDs des paramètres OpenAQ
-PARAMETER_IDS = {
-    "pm25": 2,
-    "pm10": 1,
-    "o3": 5,
-    "no2": 3,
-    "so2": 4,
-    "co": 6
-}
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TRANSFORM"))
+from validation import NonNul, Plage, valider, afficher_rapport
+from registre_openaq import get_registre
+
+# Règles appliquées aux mesures (remplace l'ancien filtre -100 < value < 1000 dans la boucle)
+REGLES_MESURES = [NonNul("value"), Plage("value", -100, 1000, inclusif=False)]
 
 
 def get_country_sensors(country_code="FR", parameter="pm25", api_key=None, limit=100):
     """
     Récupère la liste des sensor IDs pour un pays.
+    Les locations viennent du registre de métadonnées (cache disque + mémoire), pas d'un appel API à chaque fois.
     """
     if api_key is None:
         api_key = os.getenv("OPENAQ_API_KEY")
         if not api_key:
             raise ValueError("Une clé API OpenAQ doit être définie dans OPENAQ_API_KEY")
 
-    country_id = COUNTRY_IDS.get(country_code)
-    if not country_id:
-        raise ValueError(f"Code pays '{country_code}' non supporté.")
-
-    param_id = PARAMETER_IDS.get(parameter.lower(), 2)
-
-    headers = {"X-API-Key": api_key}
-    url = "https://api.openaq.org/v3/locations"
-
-    params = {
-        "countries_id": country_id,
-        "parameters_id": param_id,
-        "limit": limit
-    }
-
-    resp = requests.get(url, headers=headers, params=params)
-
-    if resp.status_code != 200:
-        print(f"⚠️  Erreur API: {resp.status_code}")
-        return []
-
-    locations = resp.json().get("results", [])
-
-    # Extraire les sensor IDs avec leurs infos de location
-    sensors = []
-    for loc in locations:
-        location_name = loc.get("name", "Inconnue")
-        city = loc.get("locality") or loc.get("city") or "Inconnue"
-        country_info = loc.get("country", {})
-        coords = loc.get("coordinates", {})
-
-        for sensor in loc.get("sensors", []):
-            if sensor.get("parameter", {}).get("id") == param_id:
-                sensors.append({
-                    "sensor_id": sensor.get("id"),
-                    "location_name": location_name,
-                    "city": city,
-                    "country": country_info.get("name", country_code),
-                    "latitude": coords.get("latitude"),
-                    "longitude": coords.get("longitude"),
-                })
-
-    return sensors
+    return get_registre(api_key).capteurs(country_code, parameter)[:limit]
 
 
 def get_sensor_latest(sensor_id, api_key):
@@ -137,23 +80,19 @@ def get_country_air_quality(country_code="FR", parameter="pm25", api_key=None, m
         measurement = get_sensor_latest(sensor["sensor_id"], api_key)
 
         if measurement:
-            value = measurement.get("value")
-
-            # Filtrer les valeurs aberrantes
-            if value is not None and -100 < value < 1000:
-                dt_obj = measurement.get("date", {})
-                dt = dt_obj.get("utc") if isinstance(dt_obj, dict) else dt_obj
-
-                rows.append({
-                    "datetime": dt,
-                    "city": sensor["city"],
-                    "location_name": sensor["location_name"],
-                    "parameter": parameter,
-                    "value": value,
-                    "unit": "µg/m³",
-                    "latitude": sensor["latitude"],
-                    "longitude": sensor["longitude"],
-                })
+            dt_obj = measurement.get("date", {})
+            dt = dt_obj.get("utc") if isinstance(dt_obj, dict) else dt_obj
+
+            rows.append({
+                "datetime": dt,
+                "city": sensor["city"],
+                "location_name": sensor["location_name"],
+                "parameter": parameter,
+                "value": measurement.get("value"),
+                "unit": "µg/m³",
+                "latitude": sensor["latitude"],
+                "longitude": sensor["longitude"],
+            })
 
         # Petite pause pour ne pas surcharger l'API
         if i < len(sensors) - 1:
@@ -163,7 +102,14 @@ def get_country_air_quality(country_code="FR", parameter="pm25", api_key=None, m
         print(f"⚠️  Aucune mesure valide pour {country_code}")
         return pd.DataFrame()
 
-    df = pd.DataFrame(rows)
+    # Filtrer les valeurs aberrantes (les lignes rejetées partent en quarantaine)
+    df, _, rapport = valider(pd.DataFrame(rows), REGLES_MESURES, nom=f"openaq_{country_code}_{parameter}")
+    if rapport["quarantaine"]:
+        afficher_rapport(f"OpenAQ {country_code}", rapport)
+
+    if df.empty:
+        print(f"⚠️  Aucune mesure valide pour {country_code}")
+        return pd.DataFrame()
 
     # Convertir datetime
     if not df.empty and "datetime" in df.columns:
@@ -176,11 +122,13 @@ def get_country_air_quality(country_code="FR", parameter="pm25", api_key=None, m
     return df
 
 
-def get_country_summary(country_code="FR", parameter="pm25", api_key=None):
+def get_country_summary(country_code="FR", parameter="pm25", api_key=None, df=None):
     """
     Obtient un résumé statistique de la qualité de l'air pour un pays.
+    Si df (résultat de get_country_air_quality) est fourni, les mesures ne sont pas re-téléchargées.
     """
-    df = get_country_air_quality(country_code, parameter, api_key=api_key, max_sensors=100)
+    if df is None:
+        df = get_country_air_quality(country_code, parameter, api_key=api_key, max_sensors=100)
 
     if df.empty:
         return None
@@ -201,11 +149,11 @@ def get_country_summary(country_code="FR", parameter="pm25", api_key=None):
     return summary
 
 
-def list_available_countries():
+def list_available_countries(api_key=None):
     """Affiche la liste des pays disponibles."""
     print("\n📋 Pays disponibles:")
-    for code, country_id in sorted(COUNTRY_IDS.items()):
-        print(f"  • {code} (ID: {country_id})")
+    for code, pays in sorted(get_registre(api_key).pays().items()):
+        print(f"  • {code} {pays['name']} (ID: {pays['id']})")
 
 
 if __name__ == "__main__":
@@ -214,7 +162,7 @@ if __name__ == "__main__":
         if not api_key:
             raise ValueError("Aucune clé API trouvée. Vérifie que OPENAQ_API_KEY est bien définie.")
 
-        list_available_countries()
+        list_available_countries(api_key)
 
         # Liste des pays à analyser
         pays = ["FR", "US", "IN", "GB", "DE", "ES"]
@@ -224,10 +172,12 @@ if __name__ == "__main__":
         print("=" * 60)
 
         resultats = []
+        mesures = {}
 
         for country in pays:
             print(f"\n{'=' * 60}")
-            summary = get_country_summary(country, parameter="pm25", api_key=api_key)
+            mesures[country] = get_country_air_quality(country, parameter="pm25", api_key=api_key, max_sensors=100)
+            summary = get_country_summary(country, parameter="pm25", api_key=api_key, df=mesures[country])
 
             if summary:
                 qualite = "🟢 Bon" if summary['moyenne'] < 12 else "🟡 Moyen" if summary[
@@ -260,7 +210,7 @@ if __name__ == "__main__":
             print(f"\n{'=' * 60}")
             print("📋 TOP 10 STATIONS LES PLUS POLLUÉES EN FRANCE")
             print("=" * 60)
-            df_france = get_country_air_quality("FR", parameter="pm25", api_key=api_key, max_sensors=100)
+            df_france = mesures.get("FR", pd.DataFrame())
 
             if not df_france.empty:
                 df_france = df_france.sort_values('value', ascending=False)
@@ -0,0 +1,362 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+import requests
+
+from grille_pays import charger_bbox, grille_pays, recuperer_grille
+from registre_openaq import get_registre, base_url as openaq_url
+
+
+dossier_backfill = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fichier_csv", "backfill")
+chemin_file = os.path.join(dossier_backfill, "file.sqlite")
+chemin_spec = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backfill_europe.json")
+
+# Une unité en échec est retentée jusqu'à MAX_TENTATIVES fois avant d'être marquée "echec"
+MAX_TENTATIVES = 3
+
+
+# --- Exécution d'une unité de travail, par source ---
+
+def _executer_open_meteo(url, variables_max=()):
+    def executer(unite, limiteur):
+        points = grille_pays(charger_bbox(pays=[unite["region"]]))
+        variables = [v for v in unite["variables"] if v not in variables_max]
+        # chaque requête de lot passe par le limiteur de la source (quota partagé, 429 retentés)
+        return recuperer_grille(url, variables, unite["debut"], unite["fin"], points,
+                                variables_max=[v for v in unite["variables"] if v in variables_max],
+                                limiteur=limiteur)
+    return executer
+
+
+_verrou_registre = threading.Lock()
+
+
+def _executer_openaq(unite, limiteur):
+    """Mesures horaires (/sensors/{id}/hours) de tous les capteurs d'un pays pour un paramètre."""
+    with _verrou_registre:
+        registre = get_registre()
+        capteurs = [c for p in unite["variables"] for c in
+                    ({**c, "parameter": p} for c in registre.capteurs(unite["region"], p))]
+    debut = f"{unite['debut']}T00:00:00Z"
+    fin = f"{(date.fromisoformat(unite['fin']) + timedelta(days=1)).isoformat()}T00:00:00Z"
+
+    lignes = []
+    for c in capteurs:
+        page = 1
+        while True:
+            limiteur.attendre()
+            resp = registre.session.get(f"{openaq_url}/sensors/{c['sensor_id']}/hours", headers=registre.headers,
+                                        params={"datetime_from": debut, "datetime_to": fin,
+                                                "limit": 1000, "page": page}, timeout=60)
+            if resp.status_code == 429:
+                limiteur.ralentir()
+                continue
+            resp.raise_for_status()
+            resultats = resp.json().get("results", [])
+            for r in resultats:
+                lignes.append({
+                    "time": ((r.get("period") or {}).get("datetimeFrom") or {}).get("utc"),
+                    "sensor_id": c["sensor_id"],
+                    "location_id": c["location_id"],
+                    "location_name": c["location_name"],
+                    "city": c["city"],
+                    "country": c["country"],
+                    "latitude": c["latitude"],
+                    "longitude": c["longitude"],
+                    "parameter": c["parameter"],
+                    "value": r.get("value"),
+                })
+            if len(resultats) < 1000:
+                break
+            page += 1
+    return pd.DataFrame(lignes)
+
+
+# Sources connues : fonction d'exécution, taille du pool et intervalle minimal entre requêtes (quota)
+SOURCES = {
+    "open_meteo_qualite_air": {
+        "executer": _executer_open_meteo("https://air-quality-api.open-meteo.com/v1/air-quality"),
+        "travailleurs": 2,
+        "intervalle": 1.0,
+    },
+    "open_meteo_meteo": {
+        "executer": _executer_open_meteo("https://archive-api.open-meteo.com/v1/archive",
+                                         variables_max=("weathercode",)),
+        "travailleurs": 2,
+        "intervalle": 1.0,
+    },
+    "openaq": {
+        "executer": _executer_openaq,
+        "travailleurs": 4,
+        # quota d'une clé OpenAQ v3 : 60 requêtes/min et 2 000/heure → 3600 s / 2000 = 1,8 s
+        "intervalle": 1.8,
+    },
+}
+
+
+class Limiteur:
+    """Espacement minimal entre deux requêtes d'une même source, partagé par tous ses travailleurs."""
+
+    def __init__(self, intervalle):
+        self.intervalle = intervalle
+        self._prochain = 0.0
+        self._verrou = threading.Lock()
+
+    def attendre(self):
+        with self._verrou:
+            maintenant = time.monotonic()
+            attente = self._prochain - maintenant
+            self._prochain = max(maintenant, self._prochain) + self.intervalle
+        if attente > 0:
+            time.sleep(attente)
+
+    def ralentir(self):
+        """Quota dépassé (HTTP 429) : intervalle doublé et pause de 10 intervalles."""
+        with self._verrou:
+            self.intervalle = min(self.intervalle * 2, 60)
+            self._prochain = time.monotonic() + 10 * self.intervalle
+
+
+# --- Expansion de la spécification ---
+
+def _regions(valeur):
+    if valeur == "europe":
+        return list(charger_bbox().index)
+    return list(valeur)
+
+
+def _periodes(debut, fin, decoupage):
+    """Découpe [debut, fin] en périodes (mois, semaine ou jour) ; bornes incluses, au format YYYY-MM-DD."""
+    debut = date.fromisoformat(debut)
+    fin = date.today() if fin in ("aujourd'hui", None) else date.fromisoformat(fin)
+    periodes = []
+    courant = debut
+    while courant <= fin:
+        if decoupage == "mois":
+            suivant = (courant.replace(day=1) + timedelta(days=32)).replace(day=1)
+        elif decoupage == "semaine":
+            suivant = courant + timedelta(days=7)
+        elif decoupage == "jour":
+            suivant = courant + timedelta(days=1)
+        else:
+            raise ValueError(f"Découpage '{decoupage}' inconnu (mois, semaine ou jour).")
+        periodes.append((courant.isoformat(), min(suivant - timedelta(days=1), fin).isoformat()))
+        courant = suivant
+    return periodes
+
+
+def developper(spec):
+    """
+    Développe une spécification {source: {regions, debut, fin, variables, decoupage}} en unités de travail
+    (source × région × période). Priorité = ancienneté de la fin de période en jours : le récent passe d'abord.
+    Une période est identifiée par son début : la période en cours (fin = aujourd'hui) reste la même unité d'un
+    jour à l'autre.
+    """
+    aujourdhui = date.today()
+    unites = []
+    for source, s in spec.items():
+        if source not in SOURCES:
+            raise ValueError(f"Source '{source}' inconnue (sources disponibles : {', '.join(SOURCES)}).")
+        for region in _regions(s["regions"]):
+            for debut, fin in _periodes(s["debut"], s.get("fin"), s.get("decoupage", "mois")):
+                unites.append({
+                    "source": source,
+                    "region": region,
+                    "debut": debut,
+                    "fin": fin,
+                    "variables": s["variables"],
+                    "priorite": (aujourdhui - date.fromisoformat(fin)).days,
+                })
+    return unites
+
+
+# --- File persistante ---
+
+class FileTravail:
+    """
+    File de travail persistante (SQLite) : une ligne par unité, état a_faire / en_cours / fait / echec.
+    L'ajout est idempotent et les unités "en_cours" d'une exécution interrompue sont remises à faire.
+    Une unité dont la fin a avancé (période en cours) est remise à faire et son fichier sera remplacé.
+    """
+
+    def __init__(self, chemin=chemin_file):
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        self.conn = sqlite3.connect(chemin)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS unites (
+                id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                region TEXT NOT NULL,
+                debut TEXT NOT NULL,
+                fin TEXT NOT NULL,
+                variables TEXT NOT NULL,
+                priorite INTEGER NOT NULL,
+                etat TEXT NOT NULL DEFAULT 'a_faire',
+                tentatives INTEGER NOT NULL DEFAULT 0,
+                lignes INTEGER,
+                erreur TEXT,
+                maj TEXT,
+                UNIQUE (source, region, debut, variables)
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_unites_file ON unites (source, etat, priorite)")
+        self.conn.execute("UPDATE unites SET etat = 'a_faire' WHERE etat = 'en_cours'")
+        self.conn.commit()
+
+    def ajouter(self, unites):
+        """Ajoute les unités absentes ; renvoie le nombre d'unités nouvelles."""
+        avant = self.conn.execute("SELECT COUNT(*) FROM unites").fetchone()[0]
+        # la priorité dépend de la date du jour : elle est recalculée ; une fin qui avance rouvre l'unité
+        self.conn.executemany(
+            "INSERT INTO unites (source, region, debut, fin, variables, priorite) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (source, region, debut, variables) DO UPDATE SET "
+            "priorite = excluded.priorite, "
+            "etat = CASE WHEN unites.fin != excluded.fin THEN 'a_faire' ELSE unites.etat END, "
+            "tentatives = CASE WHEN unites.fin != excluded.fin THEN 0 ELSE unites.tentatives END, "
+            "fin = excluded.fin",
+            [(u["source"], u["region"], u["debut"], u["fin"], json.dumps(u["variables"]), u["priorite"])
+             for u in unites])
+        self.conn.commit()
+        return self.conn.execute("SELECT COUNT(*) FROM unites").fetchone()[0] - avant
+
+    def prendre(self, source):
+        """Réserve l'unité la plus prioritaire d'une source (None si la file de cette source est vide)."""
+        ligne = self.conn.execute(
+            "SELECT id, region, debut, fin, variables, tentatives FROM unites "
+            "WHERE source = ? AND etat = 'a_faire' ORDER BY priorite, id LIMIT 1", (source,)).fetchone()
+        if ligne is None:
+            return None
+        self.conn.execute("UPDATE unites SET etat = 'en_cours', maj = ? WHERE id = ?",
+                          (datetime.now().isoformat(timespec="seconds"), ligne[0]))
+        self.conn.commit()
+        return {"id": ligne[0], "source": source, "region": ligne[1], "debut": ligne[2], "fin": ligne[3],
+                "variables": json.loads(ligne[4]), "tentatives": ligne[5]}
+
+    def terminer(self, unite, lignes):
+        self.conn.execute("UPDATE unites SET etat = 'fait', lignes = ?, erreur = NULL, maj = ? WHERE id = ?",
+                          (lignes, datetime.now().isoformat(timespec="seconds"), unite["id"]))
+        self.conn.commit()
+
+    def echouer(self, unite, erreur):
+        etat = "echec" if unite["tentatives"] + 1 >= MAX_TENTATIVES else "a_faire"
+        self.conn.execute("UPDATE unites SET etat = ?, tentatives = tentatives + 1, erreur = ?, maj = ? WHERE id = ?",
+                          (etat, str(erreur)[:500], datetime.now().isoformat(timespec="seconds"), unite["id"]))
+        self.conn.commit()
+
+    def avancement(self):
+        """DataFrame source × état (nombre d'unités)."""
+        df = pd.read_sql_query("SELECT source, etat, COUNT(*) AS n FROM unites GROUP BY source, etat", self.conn)
+        return df.pivot(index="source", columns="etat", values="n").fillna(0).astype(int)
+
+    def close(self):
+        self.conn.close()
+
+
+# --- Ordonnancement ---
+
+def _sauvegarder(unite, df, dossier=dossier_backfill):
+    """
+    Écrit le résultat d'une unité (écriture atomique : le fichier existe seulement s'il est complet).
+    Le fichier est nommé par le début de période : une période en cours rechargée remplace le précédent.
+    """
+    dossier_source = os.path.join(dossier, unite["source"])
+    os.makedirs(dossier_source, exist_ok=True)
+    chemin = os.path.join(dossier_source, f"{unite['region']}_{unite['debut']}.csv")
+    df.to_csv(chemin + ".tmp", index=False)
+    os.replace(chemin + ".tmp", chemin)
+    return chemin
+
+
+def _travailler(executer, unite, limiteur, dossier):
+    df = executer(unite, limiteur)
+    _sauvegarder(unite, df, dossier)
+    return len(df)
+
+
+def lancer(file, spec, dossier=dossier_backfill, max_unites=None):
+    """
+    Exécute la file : un pool de travailleurs par source, toutes les sources en parallèle.
+    Dès qu'un travailleur se libère, il reçoit l'unité la plus prioritaire de sa source ; chaque unité
+    terminée est enregistrée dans la file (point de reprise) après l'écriture de son résultat.
+
+    :param file: FileTravail
+    :param spec: spécification (taille des pools / intervalle surchargeables par source)
+    :param max_unites: arrêt après ce nombre d'unités (None : jusqu'à épuisement de la file)
+    :return: nombre d'unités terminées
+    """
+    pools, limiteurs = {}, {}
+    for source in spec:
+        config = {**SOURCES[source], **{k: v for k, v in spec[source].items() if k in ("travailleurs", "intervalle")}}
+        pools[source] = (ThreadPoolExecutor(max_workers=config["travailleurs"], thread_name_prefix=source),
+                         config["travailleurs"], config["executer"])
+        limiteurs[source] = Limiteur(config["intervalle"])
+
+    en_cours = {}  # future → (source, unité)
+    taches_par_source = {source: 0 for source in spec}
+    taches_lancees, terminees = 0, 0
+    sources_vides = set()
+    try:
+        while True:
+            # Remplir chaque pool jusqu'à sa taille
+            for source, (pool, taille, executer) in pools.items():
+                while taches_par_source[source] < taille and source not in sources_vides:
+                    if max_unites is not None and taches_lancees >= max_unites:
+                        break
+                    unite = file.prendre(source)
+                    if unite is None:
+                        sources_vides.add(source)
+                        break
+                    future = pool.submit(_travailler, executer, unite, limiteurs[source], dossier)
+                    en_cours[future] = (source, unite)
+                    taches_par_source[source] += 1
+                    taches_lancees += 1
+            if not en_cours:
+                break
+
+            faits, _ = wait(en_cours, return_when=FIRST_COMPLETED)
+            for future in faits:
+                source, unite = en_cours.pop(future)
+                taches_par_source[source] -= 1
+                libelle = f"{source} {unite['region']} {unite['debut']}→{unite['fin']}"
+                try:
+                    lignes = future.result()
+                except Exception as e:
+                    if isinstance(e, requests.exceptions.HTTPError) and e.response is not None \
+                            and e.response.status_code == 429:
+                        limiteurs[source].ralentir()
+                    file.echouer(unite, e)
+                    # une unité remise à faire peut être reprise : la source n'est plus considérée vide
+                    sources_vides.discard(source)
+                    print(f"⚠️  {libelle} : {e}")
+                    continue
+                file.terminer(unite, lignes)
+                terminees += 1
+                print(f"✅ {libelle} : {lignes} lignes")
+    finally:
+        for pool, _, _ in pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+    return terminees
+
+
+def charger_spec(chemin=chemin_spec):
+    with open(chemin, encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Usage : python planificateur_backfill.py [spec.json]
+    spec = charger_spec(sys.argv[1] if len(sys.argv) > 1 else chemin_spec)
+    file = FileTravail()
+    print(f"📋 {file.ajouter(developper(spec))} nouvelles unités dans la file")
+    debut = time.perf_counter()
+    n = lancer(file, spec)
+    print(f"\n⏱️  {n} unités terminées en {time.perf_counter() - debut:.0f} s")
+    print(file.avancement().to_string())
+    file.close()
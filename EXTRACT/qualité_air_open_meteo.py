@@ -1,8 +1,20 @@
+import os
 import requests
-import pandas as pd
 import time
+import sys
 from datetime import datetime
 
+from grille_pays import charger_bbox, grille_pays, recuperer_grille
+from decodage_open_meteo import decoder_hourly, vers_dataframe
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TRANSFORM"))
+from cube_horaire import CubeHoraire, dossier_cubes
+from echange_arrow import EcrivainIPC, ecrire_ipc
+from agregation_parallele import agreger_ipc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "UTILS"))
+from profilage import profileur_depuis_env
+
 # Liste des pays d'Europe avec leurs capitales (latitude, longitude)
 countries = {
     "Albania": (41.3275, 19.8189),
@@ -52,9 +64,45 @@ current_year = datetime.now().year
 today = datetime.now().strftime("%Y-%m-%d")
 years = [2023, 2024, current_year]
 
-all_data = []
+# Mode d'extraction : "capitale" (un point par pays) ou "grille" (grille régulière, moyenne pondérée par pays)
+mode = os.getenv("MODE_EXTRACTION", "capitale")
+
+# Mesure des étapes (réseau, JSON, DataFrame, dates, agrégation, écriture)
+profileur = profileur_depuis_env("qualite_air_open_meteo")
+
+# Cube binaire horaire (pays × heure × variable) alimenté au fil de l'extraction
+cube = CubeHoraire(os.path.join(dossier_cubes, "air_quality_europe"), variables=variables, origine=f"{years[0]}-01-01")
 
-for country, coords in countries.items():
+# Séries horaires émises en lots Arrow (schéma air_quality_europe_horaire) pour les étapes suivantes
+flux_horaire = EcrivainIPC("air_quality_europe_horaire")
+
+if mode == "grille":
+    points = grille_pays(charger_bbox(pays=countries))
+    print(f"Grille : {len(points)} points pour {len(countries)} pays")
+    for year in years:
+        start_date = f"{year}-01-01"
+        end_date = today if year == current_year else f"{year}-12-31"
+        print(f"Fetching grid for {year} …")
+        try:
+            with profileur.etape("grille") as m:
+                df = recuperer_grille("https://air-quality-api.open-meteo.com/v1/air-quality",
+                                      variables, start_date, end_date, points)
+                m.lignes = len(df)
+            if df.empty:
+                print(f"Aucune donnée pour {year}")
+                continue
+            df["year"] = year
+            with profileur.etape("arrow", lignes=len(df)):
+                flux_horaire.ecrire(df)
+            with profileur.etape("cube", lignes=len(df)):
+                for pays, df_pays in df.groupby("country"):
+                    cube.ecrire(pays, df_pays["time"], df_pays[variables])
+        except requests.exceptions.HTTPError as e:
+            print(f"Erreur HTTP pour la grille en {year}: {e}")
+        except Exception as e:
+            print(f"Erreur inattendue pour la grille en {year}: {e}")
+
+for country, coords in (countries.items() if mode == "capitale" else []):
     lat, lon = coords
     for year in years:
         start_date = f"{year}-01-01"
@@ -67,28 +115,42 @@ for country, coords in countries.items():
         )
         print(f"Fetching {country} for {year} …")
         try:
-            resp = requests.get(url)
-            resp.raise_for_status()
-            data = resp.json()
-            if "hourly" not in data or not data["hourly"]:
+            with profileur.etape("requete"):
+                resp = requests.get(url)
+                resp.raise_for_status()
+            # Décodage direct des octets de la réponse en tableaux float32 (temps calculé depuis début + pas)
+            with profileur.etape("decodage"):
+                blocs = decoder_hourly(resp.content, variables)
+            if not blocs or len(blocs[0]["time"]) == 0:
                 print(f"Aucune donnée pour {country} en {year}")
                 continue
-            df = pd.DataFrame(data["hourly"])
-            df["time"] = pd.to_datetime(df["time"])
+            with profileur.etape("dataframe") as m:
+                df = vers_dataframe(blocs[0])
+                m.lignes = len(df)
             df["country"] = country
             df["year"] = year
-            all_data.append(df)
+            with profileur.etape("arrow", lignes=len(df)):
+                flux_horaire.ecrire(df)
+            with profileur.etape("cube", lignes=len(df)):
+                cube.ecrire(country, df["time"], df[variables])
             time.sleep(1)
         except requests.exceptions.HTTPError as e:
             print(f"Erreur HTTP pour {country} en {year}: {e}")
         except Exception as e:
             print(f"Erreur inattendue pour {country} en {year}: {e}")
 
-if all_data:
-    df_all = pd.concat(all_data, ignore_index=True)
-    df_all['month'] = df_all['time'].dt.to_period('M')
-    monthly_avg = df_all.groupby(['country', 'year', 'month'])[variables].mean().reset_index()
-    monthly_avg.to_csv("air_quality_europe_monthly_avg.csv", index=False)
+flux_horaire.fermer()
+
+if flux_horaire.lignes:
+    # Moyennes mensuelles calculées sur le fichier Arrow horaire (mappé en mémoire, sommes en float64)
+    with profileur.etape("agregation", lignes=flux_horaire.lignes):
+        monthly_avg = agreger_ipc("air_quality_europe_horaire", variables=variables, frequence="M")
+    with profileur.etape("ecriture_csv", lignes=len(monthly_avg)):
+        monthly_avg.to_csv("air_quality_europe_monthly_avg.csv", index=False)
+    with profileur.etape("ecriture_arrow", lignes=len(monthly_avg)):
+        ecrire_ipc(monthly_avg, "air_quality_europe_monthly_avg")
     print("Fichier CSV sauvegardé avec les moyennes mensuelles.")
 else:
     print("Aucune donnée récupérée.")
+
+profileur.rapport()
@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import math
+
+import requests
+
+
+base_url = "https://api.openaq.org/v3"
+
+# Cache disque des métadonnées OpenAQ
+dossier_cache = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fichier_csv", "openaq_meta")
+
+# Durée de validité du cache (secondes)
+TTL = {
+    "countries": 30 * 24 * 3600,
+    "parameters": 30 * 24 * 3600,
+    "locations": 24 * 3600,
+}
+
+# Taille des cellules de l'index spatial (degrés)
+PAS_INDEX = 1.0
+
+
+class RegistreOpenAQ:
+    """
+    Registre des métadonnées OpenAQ (pays, paramètres, locations, capteurs).
+
+    Synchronisé en masse depuis l'API (pagination limit=1000), stocké sur disque avec un TTL
+    et gardé en mémoire avec des index par code ISO, par paramètre et par cellule spatiale.
+    """
+
+    def __init__(self, api_key=None, dossier=dossier_cache, ttl=TTL):
+        if api_key is None:
+            api_key = os.getenv("OPENAQ_API_KEY")
+            if not api_key:
+                raise ValueError("Une clé API OpenAQ doit être définie dans OPENAQ_API_KEY")
+        self.headers = {"X-API-Key": api_key}
+        self.dossier = dossier
+        self.ttl = ttl
+        self.session = requests.Session()
+
+        self._pays = None
+        self._parametres = None
+        self._locations = {}  # country_id → liste de locations
+        self._par_cellule = {}  # (i, j) → liste de locations
+        self._par_id = {}
+
+    # --- Accès API / disque ---
+
+    def _paginer(self, chemin, params=None):
+        """Récupère toutes les pages d'un endpoint de liste (erreur si une page échoue : jamais de liste tronquée)."""
+        resultats, page = [], 1
+        while True:
+            p = dict(params or {}, limit=1000, page=page)
+            resp = self.session.get(f"{base_url}/{chemin}", headers=self.headers, params=p, timeout=60)
+            if resp.status_code != 200:
+                raise ValueError(f"Erreur API {resp.status_code} pour {chemin} (page {page}) : synchronisation incomplète")
+            lot = resp.json().get("results", [])
+            resultats.extend(lot)
+            if len(lot) < 1000:
+                break
+            page += 1
+        return resultats
+
+    def _charger(self, nom, ttl, telecharger):
+        """
+        Lit le cache disque s'il est encore valide, sinon télécharge et réécrit.
+        Si le téléchargement échoue, le cache expiré est réutilisé (sans être rafraîchi) plutôt qu'une liste partielle.
+        """
+        chemin = os.path.join(self.dossier, f"{nom}.json")
+        if os.path.exists(chemin) and time.time() - os.path.getmtime(chemin) < ttl:
+            with open(chemin, encoding="utf-8") as f:
+                return json.load(f)
+        try:
+            donnees = telecharger()
+        except (ValueError, requests.exceptions.RequestException) as e:
+            if not os.path.exists(chemin):
+                raise
+            print(f"⚠️  {e} : cache expiré {nom} réutilisé")
+            with open(chemin, encoding="utf-8") as f:
+                return json.load(f)
+        if donnees:
+            os.makedirs(self.dossier, exist_ok=True)
+            tmp = chemin + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(donnees, f, ensure_ascii=False)
+            os.replace(tmp, chemin)
+        return donnees
+
+    # --- Pays et paramètres ---
+
+    def pays(self):
+        """{code ISO: {"id", "code", "name"}} pour tous les pays couverts par OpenAQ."""
+        if self._pays is None:
+            brut = self._charger("countries", self.ttl["countries"], lambda: self._paginer("countries"))
+            self._pays = {c["code"]: {"id": c["id"], "code": c["code"], "name": c.get("name")}
+                          for c in brut if c.get("code")}
+        return self._pays
+
+    def parametres(self):
+        """{nom du paramètre: {"id", "name", "units"}} (ex : "pm25" → id 2)."""
+        if self._parametres is None:
+            brut = self._charger("parameters", self.ttl["parameters"], lambda: self._paginer("parameters"))
+            self._parametres = {}
+            for p in brut:
+                # plusieurs unités possibles pour un même nom : on garde le premier id (µg/m³ en général)
+                self._parametres.setdefault(p["name"].lower(), {"id": p["id"], "name": p["name"],
+                                                                "units": p.get("units")})
+        return self._parametres
+
+    def id_pays(self, code_iso):
+        pays = self.pays().get(code_iso.upper())
+        if not pays:
+            raise ValueError(f"Code pays '{code_iso}' non supporté par OpenAQ.")
+        return pays["id"]
+
+    def id_parametre(self, parametre):
+        param = self.parametres().get(parametre.lower())
+        if not param:
+            raise ValueError(f"Paramètre '{parametre}' inconnu d'OpenAQ.")
+        return param["id"]
+
+    # --- Locations et capteurs ---
+
+    @staticmethod
+    def _normaliser(loc):
+        coords = loc.get("coordinates") or {}
+        country = loc.get("country") or {}
+        return {
+            "id": loc["id"],
+            "name": loc.get("name") or "Inconnue",
+            "city": loc.get("locality") or loc.get("city") or "Inconnue",
+            "country_id": country.get("id"),
+            "country_code": country.get("code"),
+            "country": country.get("name"),
+            "latitude": coords.get("latitude"),
+            "longitude": coords.get("longitude"),
+            "sensors": [{"id": s["id"], "parameter_id": (s.get("parameter") or {}).get("id"),
+                         "parameter": (s.get("parameter") or {}).get("name")} for s in loc.get("sensors", [])],
+        }
+
+    def _indexer(self, locations):
+        for loc in locations:
+            self._par_id[loc["id"]] = loc
+            if loc["latitude"] is not None and loc["longitude"] is not None:
+                cellule = (math.floor(loc["latitude"] / PAS_INDEX), math.floor(loc["longitude"] / PAS_INDEX))
+                self._par_cellule.setdefault(cellule, []).append(loc)
+
+    def synchroniser_locations(self, codes_iso):
+        """
+        Synchronise (ou relit depuis le cache) les locations de plusieurs pays, une requête paginée par pays.
+        """
+        for code in codes_iso:
+            country_id = self.id_pays(code)
+            if country_id in self._locations:
+                continue
+            brut = self._charger(f"locations_{code.upper()}", self.ttl["locations"],
+                                 lambda: self._paginer("locations", {"countries_id": country_id}))
+            locations = [self._normaliser(loc) for loc in brut]
+            self._locations[country_id] = locations
+            self._indexer(locations)
+
+    def locations(self, code_iso, parametre=None):
+        """Locations d'un pays, éventuellement limitées à celles qui mesurent un paramètre."""
+        self.synchroniser_locations([code_iso])
+        locations = self._locations[self.id_pays(code_iso)]
+        if parametre is None:
+            return locations
+        param_id = self.id_parametre(parametre)
+        return [loc for loc in locations if any(s["parameter_id"] == param_id for s in loc["sensors"])]
+
+    def capteurs(self, code_iso, parametre):
+        """
+        Capteurs d'un pays pour un paramètre, avec les infos de leur location
+        (même format que openaq_api.get_country_sensors).
+        """
+        param_id = self.id_parametre(parametre)
+        capteurs = []
+        for loc in self.locations(code_iso, parametre):
+            for s in loc["sensors"]:
+                if s["parameter_id"] == param_id:
+                    capteurs.append({
+                        "sensor_id": s["id"],
+                        "location_id": loc["id"],
+                        "location_name": loc["name"],
+                        "city": loc["city"],
+                        "country": loc["country"] or code_iso,
+                        "latitude": loc["latitude"],
+                        "longitude": loc["longitude"],
+                    })
+        return capteurs
+
+    def locations_bbox(self, lat_min, lon_min, lat_max, lon_max, parametre=None):
+        """
+        Locations dans une boîte englobante, parmi les pays déjà synchronisés (index par cellule).
+        """
+        param_id = self.id_parametre(parametre) if parametre else None
+        resultat = []
+        for i in range(math.floor(lat_min / PAS_INDEX), math.floor(lat_max / PAS_INDEX) + 1):
+            for j in range(math.floor(lon_min / PAS_INDEX), math.floor(lon_max / PAS_INDEX) + 1):
+                for loc in self._par_cellule.get((i, j), []):
+                    if not (lat_min <= loc["latitude"] <= lat_max and lon_min <= loc["longitude"] <= lon_max):
+                        continue
+                    if param_id is None or any(s["parameter_id"] == param_id for s in loc["sensors"]):
+                        resultat.append(loc)
+        return resultat
+
+    def location(self, location_id):
+        return self._par_id.get(location_id)
+
+
+_registres = {}
+
+
+def get_registre(api_key=None):
+    """Registre partagé (mémoïsé par clé API) pour éviter de relire le cache à chaque appel."""
+    api_key = api_key or os.getenv("OPENAQ_API_KEY")
+    if api_key not in _registres:
+        _registres[api_key] = RegistreOpenAQ(api_key)
+    return _registres[api_key]
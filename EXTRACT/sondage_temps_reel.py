@@ -0,0 +1,246 @@
+import os
+import json
+import time
+from datetime import datetime, timezone
+
+import requests
+
+
+# Zone surveillée (même boîte que api_aqicn/aqicn.py) : lat1, lng1, lat2, lng2
+ZONE_EUROPE = (34.5, -11.5, 71.0, 40.0)
+
+# Intervalle entre deux sondages par source (secondes)
+INTERVALLES = {
+    "waqi": 600,
+    "openaq": 600,
+}
+
+# Paramètres OpenAQ suivis (id du paramètre → nom)
+PARAMETRES_OPENAQ = {2: "pm25", 1: "pm10", 5: "o3", 3: "no2"}
+
+dossier_flux = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fichier_csv", "flux")
+chemin_etat = os.path.join(dossier_flux, "etat_sondage.json")
+
+# Renvoyé par get_conditionnel quand la ressource n'a pas changé (304), à distinguer d'une erreur (None)
+NON_MODIFIE = object()
+
+
+def _instant(horodatage):
+    """Horodatage ISO 8601 en datetime comparable (UTC si pas de fuseau) ; None si illisible."""
+    try:
+        instant = datetime.fromisoformat(horodatage)
+    except (TypeError, ValueError):
+        return None
+    return instant if instant.tzinfo else instant.replace(tzinfo=timezone.utc)
+
+
+class Etat:
+    """
+    État persistant du sondage : ETag / Last-Modified par URL, dernier horodatage vu par station
+    et nombre de pages des endpoints paginés.
+    Permet de redémarrer le démon sans réémettre les mesures déjà journalisées.
+    """
+
+    def __init__(self, chemin=chemin_etat):
+        self.chemin = chemin
+        self.entetes = {}
+        self.vus = {}
+        self.pages = {}
+        if os.path.exists(chemin):
+            with open(chemin, encoding="utf-8") as f:
+                etat = json.load(f)
+            self.entetes = etat.get("entetes", {})
+            self.vus = etat.get("vus", {})
+            self.pages = etat.get("pages", {})
+
+    def sauvegarder(self):
+        os.makedirs(os.path.dirname(self.chemin), exist_ok=True)
+        tmp = self.chemin + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"entetes": self.entetes, "vus": self.vus, "pages": self.pages}, f)
+        os.replace(tmp, self.chemin)
+
+    def nouveau(self, cle, horodatage):
+        """Vrai (et mémorise) si horodatage est plus récent que le dernier vu pour cette clé."""
+        instant = _instant(horodatage)
+        if instant is None:
+            return False
+        precedent = _instant(self.vus.get(cle))
+        if precedent is not None and instant <= precedent:
+            return False
+        self.vus[cle] = horodatage
+        return True
+
+
+class Journal:
+    """
+    Journal en ajout seul (JSON Lines compact, un fichier par jour UTC).
+    """
+
+    def __init__(self, dossier=dossier_flux):
+        self.dossier = dossier
+        os.makedirs(dossier, exist_ok=True)
+
+    def ajouter(self, mesures):
+        if not mesures:
+            return
+        jour = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        chemin = os.path.join(self.dossier, f"mesures_{jour}.jsonl")
+        with open(chemin, "a", encoding="utf-8") as f:
+            for m in mesures:
+                f.write(json.dumps(m, separators=(",", ":"), ensure_ascii=False) + "\n")
+
+
+def get_conditionnel(session, url, etat, params=None, headers=None):
+    """
+    GET conditionnel (If-None-Match / If-Modified-Since).
+
+    :return: le JSON de réponse, NON_MODIFIE si la ressource n'a pas changé (304), None en cas d'erreur
+    """
+    headers = dict(headers or {})
+    cle = url + "?" + "&".join(f"{k}={v}" for k, v in sorted((params or {}).items()) if k != "token")
+    precedent = etat.entetes.get(cle, {})
+    if precedent.get("etag"):
+        headers["If-None-Match"] = precedent["etag"]
+    if precedent.get("last_modified"):
+        headers["If-Modified-Since"] = precedent["last_modified"]
+
+    resp = session.get(url, params=params, headers=headers, timeout=30)
+    if resp.status_code == 304:
+        return NON_MODIFIE
+    if resp.status_code != 200:
+        print(f"⚠️  Erreur API {resp.status_code} pour {url}")
+        return None
+
+    nouveaux = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+    if any(nouveaux.values()):
+        etat.entetes[cle] = nouveaux
+    return resp.json()
+
+
+def sonder_waqi(session, etat, token, zone=ZONE_EUROPE):
+    """
+    Une seule requête map/bounds pour toute la zone : chaque station y figure avec son AQI et
+    l'heure de sa dernière mesure. Seules les stations dont l'heure a changé sont émises.
+    """
+    data = get_conditionnel(session, "https://api.waqi.info/map/bounds/", etat,
+                            params={"token": token, "latlng": ",".join(map(str, zone))})
+    if data is None or data is NON_MODIFIE or data.get("status") != "ok":
+        return []
+
+    mesures = []
+    for s in data.get("data", []):
+        station = s.get("station", {})
+        horodatage = station.get("time")
+        if s.get("aqi") in (None, "-") or not etat.nouveau(f"waqi:{s.get('uid')}", horodatage):
+            continue
+        mesures.append({
+            "src": "waqi",
+            "id": s.get("uid"),
+            "t": horodatage,
+            "p": "aqi",
+            "v": float(s["aqi"]),
+            "lat": s.get("lat"),
+            "lon": s.get("lon"),
+            "nom": station.get("name"),
+        })
+    return mesures
+
+
+def sonder_openaq(session, etat, api_key, zone=ZONE_EUROPE, parametres=PARAMETRES_OPENAQ, limit=1000):
+    """
+    Dernières valeurs OpenAQ par paramètre (/parameters/{id}/latest, paginé), filtrées sur la zone.
+    Seuls les capteurs dont le datetime est plus récent que le dernier vu sont émis.
+
+    Chaque page a ses propres ETag : une page inchangée (304) est sautée et la suivante est demandée,
+    jusqu'au nombre de pages vu au dernier parcours complet. Seule une erreur interrompt le parcours.
+    """
+    lat1, lon1, lat2, lon2 = zone
+    headers = {"X-API-Key": api_key}
+    mesures = []
+    for param_id, nom in parametres.items():
+        cle_pages = f"openaq:{param_id}"
+        page = 1
+        while True:
+            data = get_conditionnel(session, f"https://api.openaq.org/v3/parameters/{param_id}/latest", etat,
+                                    params={"limit": limit, "page": page}, headers=headers)
+            if data is None:
+                break
+            if data is NON_MODIFIE:
+                if page >= etat.pages.get(cle_pages, 1):
+                    break
+                page += 1
+                continue
+            resultats = data.get("results", [])
+            for r in resultats:
+                coords = r.get("coordinates") or {}
+                lat, lon = coords.get("latitude"), coords.get("longitude")
+                if lat is None or lon is None or not (lat1 <= lat <= lat2 and lon1 <= lon <= lon2):
+                    continue
+                horodatage = (r.get("datetime") or {}).get("utc")
+                if r.get("value") is None or not etat.nouveau(f"openaq:{r.get('sensorsId')}", horodatage):
+                    continue
+                mesures.append({
+                    "src": "openaq",
+                    "id": r.get("sensorsId"),
+                    "loc": r.get("locationsId"),
+                    "t": horodatage,
+                    "p": nom,
+                    "v": r["value"],
+                    "lat": lat,
+                    "lon": lon,
+                })
+            if len(resultats) < limit:
+                etat.pages[cle_pages] = page
+                break
+            page += 1
+    return mesures
+
+
+def demarrer(intervalles=INTERVALLES, iterations=None):
+    """
+    Boucle principale : chaque source est sondée à son propre rythme, les nouvelles mesures sont
+    ajoutées au journal et l'état est sauvegardé après chaque sondage.
+
+    :param intervalles: {source: secondes}
+    :param iterations: nombre de tours (None = infini)
+    """
+    token = os.getenv("WAQI_TOKEN")
+    api_key = os.getenv("OPENAQ_API_KEY")
+    sources = {}
+    if token:
+        sources["waqi"] = lambda session, etat: sonder_waqi(session, etat, token)
+    if api_key:
+        sources["openaq"] = lambda session, etat: sonder_openaq(session, etat, api_key)
+    if not sources:
+        raise ValueError("Définir WAQI_TOKEN et/ou OPENAQ_API_KEY.")
+
+    etat = Etat()
+    journal = Journal()
+    session = requests.Session()
+    prochains = {nom: 0.0 for nom in sources}
+
+    tour = 0
+    while iterations is None or tour < iterations:
+        maintenant = time.monotonic()
+        for nom, sonder in sources.items():
+            if maintenant < prochains[nom]:
+                continue
+            try:
+                mesures = sonder(session, etat)
+                journal.ajouter(mesures)
+                etat.sauvegarder()
+                print(f"[{datetime.now():%H:%M:%S}] {nom} : {len(mesures)} nouvelles mesures")
+            except requests.exceptions.RequestException as e:
+                print(f"⚠️  Erreur réseau {nom} : {e}")
+            prochains[nom] = maintenant + intervalles[nom]
+        tour += 1
+        if iterations is None or tour < iterations:
+            time.sleep(max(0.0, min(prochains.values()) - time.monotonic()))
+
+
+if __name__ == "__main__":
+    try:
+        demarrer()
+    except KeyboardInterrupt:
+        print("\nArrêt du sondage.")
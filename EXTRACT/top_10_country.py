@@ -2,6 +2,7 @@ import os
 import requests
 import pandas as pd
 
+from registre_openaq import get_registre
 
 API_KEY = os.getenv("OPENAQ_API_KEY")
 HEADERS = {"X-API-Key": API_KEY}
@@ -16,32 +17,25 @@ europe_countries = [
 base_url = "https://api.openaq.org/v3"
 
 def get_country_locations(country_code):
-
-    url = f"{base_url}/locations"
-    params = {
-        "country": country_code,
-        "parameter": "pm25",
-        "limit": 100
-    }
-    resp = requests.get(url, headers=HEADERS, params=params)
-    if resp.status_code != 200:
-        print(f" Erreur pour {country_code}: {resp.json()}")
+    """Locations PM2.5 d'un pays, depuis le registre de métadonnées (cache disque + mémoire)."""
+    try:
+        return get_registre(API_KEY).locations(country_code, "pm25")[:100]
+    except ValueError as e:
+        print(f" Erreur pour {country_code}: {e}")
         return []
-    data = resp.json()
-    return data.get("results", [])
 
-def get_latest_pm25(location_id):
+def get_latest_pm25(location):
     """Récupère la dernière valeur PM2.5 pour une location"""
-    url = f"{base_url}/locations/{location_id}/latest"
+    capteurs_pm25 = {s["id"] for s in location["sensors"] if s["parameter"] == "pm25"}
+    url = f"{base_url}/locations/{location['id']}/latest"
     resp = requests.get(url, headers=HEADERS)
     if resp.status_code != 200:
         return None
     data = resp.json()
     results = data.get("results", [])
     for r in results:
-        for m in r.get("measurements", []):
-            if m["parameter"] == "pm25":
-                return m["value"]
+        if r.get("sensorsId") in capteurs_pm25:
+            return r.get("value")
     return None
 
 # Stockage des moyennes par pays
@@ -54,7 +48,7 @@ for country in europe_countries:
         continue
     values = []
     for loc in locations:
-        val = get_latest_pm25(loc["id"])
+        val = get_latest_pm25(loc)
         if val is not None:
             values.append(val)
     if values:
@@ -0,0 +1,261 @@
+import os
+import io
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+# Manifestes des partitions déjà chargées, un par cible : {table: {"pays|mois": "empreinte"}}
+dossier_manifestes = os.path.dirname(os.path.abspath(__file__))
+
+# Colonnes candidates pour les clés de partition (pays, mois)
+COLONNES_PAYS = ["country", "Pays"]
+COLONNES_MOIS = ["month", "time", "datetime"]
+
+
+class Manifeste:
+    """
+    Empreintes des partitions (table, pays, mois) déjà présentes dans l'entrepôt.
+    Une cible (BigQuery, local) = un manifeste, mis à jour seulement après un chargement réussi.
+    """
+
+    def __init__(self, cible):
+        self.chemin = os.path.join(dossier_manifestes, f"manifeste_{cible}.json")
+        self.tables = {}
+        if os.path.exists(self.chemin):
+            with open(self.chemin, encoding="utf-8") as f:
+                self.tables = json.load(f)
+
+    def get(self, table):
+        return self.tables.get(table, {})
+
+    def mettre_a_jour(self, table, empreintes):
+        self.tables[table] = empreintes
+        self.sauvegarder()
+
+    def sauvegarder(self):
+        tmp = self.chemin + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.tables, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.chemin)
+
+
+def _est_arrow(df):
+    """Vrai pour une table pyarrow (échange Arrow, voir TRANSFORM/echange_arrow.py)."""
+    return hasattr(df, "schema") and hasattr(df, "column_names")
+
+
+def _noms_colonnes(df):
+    return df.column_names if _est_arrow(df) else list(df.columns)
+
+
+def colonnes_partition(df):
+    """
+    Renvoie (colonne pays, colonne mois) utilisées pour partitionner une table (None si absentes).
+    """
+    noms = _noms_colonnes(df)
+    pays = next((c for c in COLONNES_PAYS if c in noms), None)
+    mois = next((c for c in COLONNES_MOIS if c in noms), None)
+    return pays, mois
+
+
+def cles_partition(df):
+    """
+    Clé de partition "pays|AAAA-MM" de chaque ligne (vectorisé).
+    Sans colonne pays ou mois, la partie manquante vaut "*".
+    """
+    pays, mois = colonnes_partition(df)
+    cle_pays = df[pays].fillna("").astype(str) if pays else pd.Series("*", index=df.index)
+    cle_mois = df[mois].fillna("").astype(str).str[:7] if mois else pd.Series("*", index=df.index)
+    return cle_pays + "|" + cle_mois
+
+
+def cles_partition_arrow(table):
+    """Clé de partition "pays|AAAA-MM" de chaque ligne d'une table Arrow (calculée par pyarrow.compute)."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    pays, mois = colonnes_partition(table)
+    n = table.num_rows
+    cle_pays = pc.fill_null(pc.cast(table[pays], pa.string()), "") if pays else pa.array(["*"] * n)
+    if mois:
+        colonne = table[mois]
+        texte = pc.strftime(colonne, format="%Y-%m") if pa.types.is_temporal(colonne.type) \
+            else pc.utf8_slice_codeunits(pc.cast(colonne, pa.string()), 0, 7)
+        cle_mois = pc.fill_null(texte, "")
+    else:
+        cle_mois = pa.array(["*"] * n)
+    return pc.binary_join_element_wise(cle_pays, cle_mois, "|")
+
+
+def _empreintes_arrow(table):
+    """
+    Empreintes des partitions d'une table Arrow, sans passer par pandas : la table est triée
+    (clé puis toutes les colonnes, donc indépendante de l'ordre des lignes) et chaque tranche de
+    partition est sérialisée en IPC puis hachée.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    cles = cles_partition_arrow(table)
+    triee = table.append_column("__cle", cles).sort_by([("__cle", "ascending")]
+                                                       + [(c, "ascending") for c in table.column_names])
+    cles_triees = triee["__cle"].to_numpy()
+    triee = triee.drop_columns(["__cle"])
+    empreintes = {}
+    if len(cles_triees):
+        debuts = np.flatnonzero(np.r_[True, cles_triees[1:] != cles_triees[:-1]])
+        fins = np.r_[debuts[1:], len(cles_triees)]
+        for debut, fin in zip(debuts, fins):
+            puits = pa.BufferOutputStream()
+            with pa.ipc.new_stream(puits, triee.schema) as w:
+                w.write_table(triee.slice(debut, fin - debut))
+            h = hashlib.blake2b(puits.getvalue().to_pybytes(), digest_size=8).hexdigest()
+            empreintes[cles_triees[debut]] = f"{h}-{fin - debut}"
+    return cles, empreintes
+
+
+def empreintes_partitions(df):
+    """
+    Empreinte de chaque partition : somme (modulo 2^64) des hachages de lignes + nombre de lignes.
+    Indépendante de l'ordre des lignes, donc un CSV simplement réordonné n'est pas rechargé.
+
+    :return: (Series des clés par ligne, dict {clé: empreinte})
+    """
+    if _est_arrow(df):
+        return _empreintes_arrow(df)
+    cles = cles_partition(df)
+    hachages = pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64)
+    groupes = pd.DataFrame({"cle": cles.to_numpy(), "h": hachages}).groupby("cle")["h"]
+    # somme uint64 avec débordement volontaire (arithmétique modulo 2^64)
+    sommes = groupes.agg(lambda h: int(np.add.reduce(h.to_numpy(), dtype=np.uint64)))
+    tailles = groupes.size()
+    empreintes = {cle: f"{sommes[cle]:016x}-{tailles[cle]}" for cle in sommes.index}
+    return cles, empreintes
+
+
+def partitions_modifiees(df, table, manifeste):
+    """
+    Compare les partitions d'un DataFrame au manifeste.
+
+    :return: (lignes à charger, clés modifiées/nouvelles, clés supprimées, nouvelles empreintes)
+    """
+    cles, empreintes = empreintes_partitions(df)
+    anciennes = manifeste.get(table)
+    modifiees = sorted(c for c, e in empreintes.items() if anciennes.get(c) != e)
+    supprimees = sorted(set(anciennes) - set(empreintes))
+    if _est_arrow(df):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        return df.filter(pc.is_in(cles, value_set=pa.array(modifiees, pa.string()))), modifiees, supprimees, empreintes
+    return df[cles.isin(modifiees).to_numpy()], modifiees, supprimees, empreintes
+
+
+def _expression_cle_sql(df, dialecte):
+    """Expression SQL recalculant la clé "pays|mois" côté entrepôt."""
+    pays, mois = colonnes_partition(df)
+    if dialecte == "bigquery":
+        p = f"COALESCE(CAST(`{pays}` AS STRING), '')" if pays else "'*'"
+        m = f"SUBSTR(COALESCE(CAST(`{mois}` AS STRING), ''), 1, 7)" if mois else "'*'"
+        return f"CONCAT({p}, '|', {m})"
+    p = f'COALESCE(CAST("{pays}" AS TEXT), \'\')' if pays else "'*'"
+    m = f'substr(COALESCE(CAST("{mois}" AS TEXT), \'\'), 1, 7)' if mois else "'*'"
+    return f"{p} || '|' || {m}"
+
+
+def _charger_bigquery(client, donnees, table_ref, write_disposition=None):
+    """
+    Job de chargement BigQuery depuis un DataFrame ou une table Arrow.
+    Une table Arrow est sérialisée directement en Parquet (types conservés, sans conversion pandas).
+    """
+    from google.cloud import bigquery
+
+    if not _est_arrow(donnees):
+        config = bigquery.LoadJobConfig(write_disposition=write_disposition) if write_disposition else None
+        client.load_table_from_dataframe(donnees, table_ref, job_config=config).result()
+        return
+
+    import pyarrow.parquet as pq
+
+    tampon = io.BytesIO()
+    pq.write_table(donnees, tampon)
+    tampon.seek(0)
+    config = bigquery.LoadJobConfig(source_format=bigquery.SourceFormat.PARQUET,
+                                    write_disposition=write_disposition or "WRITE_APPEND")
+    client.load_table_from_file(tampon, table_ref, job_config=config).result()
+
+
+def upsert_bigquery(client, dataset_ref, table_name, df, lignes, a_remplacer):
+    """
+    Remplace les partitions modifiées d'une table BigQuery :
+    chargement des lignes dans une table de staging puis DELETE + INSERT dans une transaction.
+    df et lignes peuvent être des DataFrames ou des tables Arrow.
+    """
+    from google.cloud import bigquery
+    from google.api_core.exceptions import NotFound
+
+    table_ref = dataset_ref.table(table_name)
+    try:
+        client.get_table(table_ref)
+    except NotFound:
+        # Première fois : chargement complet
+        _charger_bigquery(client, df, table_ref)
+        return
+
+    staging_ref = dataset_ref.table(f"{table_name}__staging")
+    _charger_bigquery(client, lignes, staging_ref, write_disposition="WRITE_TRUNCATE")
+
+    cible = f"`{client.project}.{dataset_ref.dataset_id}.{table_name}`"
+    staging = f"`{client.project}.{dataset_ref.dataset_id}.{table_name}__staging`"
+    colonnes = ", ".join(f"`{c}`" for c in _noms_colonnes(df))
+    sql = (
+        "BEGIN TRANSACTION;\n"
+        f"DELETE FROM {cible} WHERE {_expression_cle_sql(df, 'bigquery')} IN UNNEST(@cles);\n"
+        f"INSERT INTO {cible} ({colonnes}) SELECT {colonnes} FROM {staging};\n"
+        "COMMIT TRANSACTION;"
+    )
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ArrayQueryParameter("cles", "STRING", a_remplacer)]
+    )
+    client.query(sql, job_config=job_config).result()
+    client.delete_table(staging_ref, not_found_ok=True)
+
+
+def upsert_local(entrepot, table_name, df, lignes, a_remplacer):
+    """
+    Remplace les partitions modifiées d'une table de l'entrepôt local (même logique que BigQuery).
+    SQLite est alimenté par pandas.to_sql : une table Arrow est convertie à ce moment-là.
+    """
+    if _est_arrow(df):
+        df, lignes = df.to_pandas(), lignes.to_pandas()
+    if not entrepot.colonnes(table_name):
+        entrepot.charger_dataframe(df, table_name)
+        return
+
+    conn = entrepot.conn
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS cles_a_remplacer (cle TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM cles_a_remplacer")
+    conn.executemany("INSERT INTO cles_a_remplacer VALUES (?)", [(c,) for c in a_remplacer])
+    conn.execute(f'DELETE FROM "{table_name}" WHERE {_expression_cle_sql(df, "sqlite")} '
+                 f'IN (SELECT cle FROM cles_a_remplacer)')
+    entrepot.charger_dataframe(lignes, table_name, if_exists="append")
+
+
+def charger_table(df, table_name, manifeste, ecrire):
+    """
+    Chargement idempotent d'une table : seules les partitions modifiées sont envoyées.
+
+    :param df: contenu complet de la table (DataFrame du CSV source ou table Arrow)
+    :param table_name: nom de la table cible
+    :param manifeste: Manifeste de la cible
+    :param ecrire: fonction (df, lignes, cles_a_remplacer) effectuant l'upsert
+    :return: nombre de lignes envoyées
+    """
+    lignes, modifiees, supprimees, empreintes = partitions_modifiees(df, table_name, manifeste)
+    if not modifiees and not supprimees:
+        return 0
+    ecrire(df, lignes, modifiees + supprimees)
+    manifeste.mettre_a_jour(table_name, empreintes)
+    return len(lignes)
@@ -0,0 +1,151 @@
+import os
+import sys
+import sqlite3
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TRANSFORM"))
+from validation import lire_csv, valider, afficher_rapport
+
+
+# Fichier SQLite par défaut (à côté des CSV)
+chemin_entrepot = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fichier_csv", "entrepot.sqlite")
+
+# Index créés automatiquement quand les colonnes existent dans la table
+INDEX = [
+    ("country", "time"),
+    ("country", "year", "month"),
+]
+
+
+class EntrepotLocal:
+    """
+    Entrepôt analytique embarqué (SQLite) utilisable à la place de BigQuery, ou en plus.
+    Les tables portent le même nom que dans BigQuery (nom du CSV sans extension).
+    """
+
+    def __init__(self, chemin=chemin_entrepot):
+        self.chemin = chemin
+        self.conn = sqlite3.connect(chemin)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def colonnes(self, table):
+        """Liste des colonnes d'une table (vide si la table n'existe pas)."""
+        return [r[1] for r in self.conn.execute(f'PRAGMA table_info("{table}")')]
+
+    def tables(self):
+        return [r[0] for r in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+
+    def charger_dataframe(self, df, table, if_exists="replace"):
+        """
+        Écrit un DataFrame dans une table puis crée les index (country, time) / (country, year, month).
+
+        :param df: DataFrame à charger
+        :param table: nom de la table
+        :param if_exists: "replace" ou "append"
+        """
+        df.to_sql(table, self.conn, if_exists=if_exists, index=False, chunksize=50_000)
+        cols = set(self.colonnes(table))
+        for index in INDEX:
+            if set(index) <= cols:
+                nom = f"idx_{table}_{'_'.join(index)}"
+                self.conn.execute(f'CREATE INDEX IF NOT EXISTS "{nom}" ON "{table}" ({", ".join(index)})')
+        self.conn.commit()
+
+    def requete(self, sql, params=()):
+        """Exécute une requête SQL et renvoie un DataFrame."""
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def _verifier(self, table, *colonnes):
+        cols = self.colonnes(table)
+        if not cols:
+            raise ValueError(f"Table '{table}' inexistante.")
+        for c in colonnes:
+            if c not in cols:
+                raise ValueError(f"Colonne '{c}' absente de la table '{table}'.")
+
+    def top_pays_pollues(self, table="air_quality_europe_monthly_avg", polluant="pm2_5", n=10, pays="country"):
+        """
+        Top N des pays les plus pollués (moyenne du polluant sur toute la table).
+        """
+        self._verifier(table, polluant, pays)
+        return self.requete(
+            f'SELECT "{pays}" AS country, AVG("{polluant}") AS {polluant} FROM "{table}" '
+            f'WHERE "{polluant}" IS NOT NULL GROUP BY "{pays}" ORDER BY 2 DESC LIMIT ?',
+            (n,)
+        )
+
+    def moyennes_mensuelles(self, table="air_quality_europe", polluants=("pm2_5",), country=None):
+        """
+        Moyennes mensuelles par pays, calculées depuis une table horaire (colonne time)
+        ou lues directement dans une table déjà agrégée (colonnes year, month).
+        """
+        polluants = list(polluants)
+        self._verifier(table, "country", *polluants)
+        cols = self.colonnes(table)
+        moyennes = ", ".join(f'AVG("{p}") AS "{p}"' for p in polluants)
+        where, params = "", ()
+        if country is not None:
+            where, params = "WHERE country = ?", (country,)
+
+        if "month" in cols and "year" in cols:
+            sql = (f'SELECT country, year, month, {moyennes} FROM "{table}" {where} '
+                   f'GROUP BY country, year, month ORDER BY country, year, month')
+        else:
+            self._verifier(table, "time")
+            sql = (f'SELECT country, CAST(substr(time, 1, 4) AS INTEGER) AS year, substr(time, 1, 7) AS month, '
+                   f'{moyennes} FROM "{table}" {where} GROUP BY country, month ORDER BY country, month')
+        return self.requete(sql, params)
+
+    def classement_stations(self, table="resultats_stations_detail_histo", valeur="iaqi_pm25",
+                            station="station_name", n=10):
+        """
+        Classement des stations les plus polluées (ex : résultats AQICN ou OpenAQ).
+        """
+        self._verifier(table, valeur, station)
+        return self.requete(
+            f'SELECT "{station}" AS station, AVG("{valeur}") AS valeur, COUNT(*) AS nb_mesures FROM "{table}" '
+            f'WHERE "{valeur}" IS NOT NULL GROUP BY "{station}" ORDER BY valeur DESC LIMIT ?',
+            (n,)
+        )
+
+
+def charger_dossier_csv(dossier, entrepot):
+    """
+    Charge tous les CSV d'un dossier dans l'entrepôt local (une table par fichier).
+    Lignes malformées et lignes invalides partent en quarantaine, comme pour LOAD/fichier_un.py.
+    """
+    for filename in os.listdir(dossier):
+        if filename.endswith(".csv"):
+            csv_file = os.path.join(dossier, filename)
+            table_name = os.path.splitext(filename)[0]
+            try:
+                df = lire_csv(csv_file, nom=table_name)
+            except Exception as e:
+                print(f"Erreur lecture CSV {csv_file} : {e}")
+                continue
+            df, _, rapport = valider(df, nom=table_name)
+            afficher_rapport(table_name, rapport)
+            entrepot.charger_dataframe(df, table_name)
+            print(f"Fichier chargé : {csv_file} → Table locale : {table_name}")
+
+
+if __name__ == "__main__":
+    dossier_csv = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fichier_csv")
+
+    with EntrepotLocal() as entrepot:
+        charger_dossier_csv(dossier_csv, entrepot)
+
+        print("\nTop 10 des pays les plus pollués (PM2.5, moyennes mensuelles) :")
+        print(entrepot.top_pays_pollues(n=10).to_string(index=False))
+
+        print("\nMoyennes mensuelles France (données horaires) :")
+        print(entrepot.moyennes_mensuelles("air_quality_europe", ["pm2_5", "pm10"], country="France").to_string(index=False))
@@ -1,6 +1,14 @@
 from google.cloud import bigquery
-import pandas as pd
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TRANSFORM"))
+from validation import lire_csv, valider, valider_arrow, afficher_rapport
+from echange_arrow import DATASETS_CHARGES, datasets_disponibles, lire_ipc
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "UTILS"))
+from profilage import profileur_depuis_env
+from entrepot_local import EntrepotLocal
+from chargement_incremental import Manifeste, charger_table, upsert_bigquery, upsert_local
 
 
 csv_folder = r"C:\HETIC\2025-2026\Projet_File_0range\projet_file_orange\fichier_csv"
@@ -8,35 +16,88 @@ project_id = "projet-fil-orange-477313"
 dataset_id = "air_quality_europe_monthly_avg"
 keyfile_path = r"projet_file_orange/LOAD/clé_secrete/keyfile.json.json"
 
+# Cibles de chargement : "bigquery", "local" (entrepôt SQLite embarqué) ou les deux
+cibles = os.getenv("LOAD_CIBLES", "bigquery").split(",")
+
+
+if "bigquery" in cibles:
+    client = bigquery.Client.from_service_account_json(keyfile_path, project=project_id)
+
+    dataset_ref = client.dataset(dataset_id)
+    dataset = bigquery.Dataset(dataset_ref)
+    dataset.location = "EU"
+
+    try:
+        client.create_dataset(dataset)
+        print(f"Dataset créé : {dataset_id}")
+    except Exception as e:
+        print(f"Dataset existe déjà ou erreur : {e}")
+
+profileur = profileur_depuis_env("chargement")
+
+entrepot = EntrepotLocal() if "local" in cibles else None
+manifestes = {cible: Manifeste(cible) for cible in cibles}
+
+
+def charger(df, table_name, source):
+    """Envoie un DataFrame ou une table Arrow vers chaque cible (partitions (pays, mois) modifiées seulement)."""
+    if entrepot is not None:
+        with profileur.etape("chargement_local") as m:
+            n = m.lignes = charger_table(df, table_name, manifestes["local"],
+                                         lambda df, lignes, cles: upsert_local(entrepot, table_name, df, lignes, cles))
+        print(f"Fichier chargé : {source} → Table locale : {table_name} ({n} lignes envoyées)")
 
-client = bigquery.Client.from_service_account_json(keyfile_path, project=project_id)
+    if "bigquery" in cibles:
+        try:
+            with profileur.etape("chargement_bigquery") as m:
+                n = m.lignes = charger_table(df, table_name, manifestes["bigquery"],
+                                             lambda df, lignes, cles: upsert_bigquery(client, dataset_ref, table_name,
+                                                                                      df, lignes, cles))
+            print(f"Fichier chargé : {source} → Table BigQuery : {dataset_id}.{table_name} ({n} lignes envoyées)")
+        except Exception as e:
+            print(f"Erreur chargement BigQuery pour {source} : {e}")
 
 
-dataset_ref = client.dataset(dataset_id)
-dataset = bigquery.Dataset(dataset_ref)
-dataset.location = "EU"
+# Datasets Arrow (fichier_csv/arrow/) : types conservés, envoyés sans conversion pandas.
+# Ils remplacent le CSV de même nom.
+datasets_arrow = [nom for nom in datasets_disponibles() if nom in DATASETS_CHARGES]
+for table_name in datasets_arrow:
+    try:
+        with profileur.etape("lecture_arrow") as m:
+            table = lire_ipc(table_name)
+            m.lignes = table.num_rows
+    except Exception as e:
+        print(f"Erreur lecture Arrow {table_name} : {e}")
+        continue
+    # Types et colonnes clés sont garantis par le schéma ; plages, doublons et quarantaine par les règles
+    with profileur.etape("validation", lignes=table.num_rows):
+        table, _, rapport = valider_arrow(table, nom=table_name)
+    afficher_rapport(table_name, rapport)
 
-try:
-    client.create_dataset(dataset)
-    print(f"Dataset créé : {dataset_id}")
-except Exception as e:
-    print(f"Dataset existe déjà ou erreur : {e}")
+    charger(table, table_name, f"{table_name}.arrow")
 
 for filename in os.listdir(csv_folder):
     if filename.endswith(".csv"):
         csv_file = os.path.join(csv_folder, filename)
+        table_name = os.path.splitext(filename)[0]
+        if table_name in datasets_arrow:
+            continue
         try:
-            df = pd.read_csv(csv_file, on_bad_lines='skip')
+            with profileur.etape("lecture_csv") as m:
+                df = lire_csv(csv_file, nom=table_name)
+                m.lignes = len(df)
         except Exception as e:
             print(f"Erreur lecture CSV {csv_file} : {e}")
             continue
 
-        table_name = os.path.splitext(filename)[0]
-        table_ref = dataset_ref.table(table_name)
+        # Les lignes invalides partent dans fichier_csv/quarantaine/ au lieu d'être chargées
+        with profileur.etape("validation", lignes=len(df)):
+            df, _, rapport = valider(df, nom=table_name)
+        afficher_rapport(table_name, rapport)
 
-        try:
-            job = client.load_table_from_dataframe(df, table_ref)
-            job.result()
-            print(f"Fichier chargé : {csv_file} → Table BigQuery : {dataset_id}.{table_name}")
-        except Exception as e:
-            print(f"Erreur chargement BigQuery pour {csv_file} : {e}")
+        charger(df, table_name, csv_file)
+
+if entrepot is not None:
+    entrepot.close()
+
+profileur.rapport()
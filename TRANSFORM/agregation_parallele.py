@@ -0,0 +1,248 @@
+import os
+import io
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from echange_arrow import dossier_arrow, lots_ipc
+
+
+# Variables par défaut (mêmes noms que dans qualité_air_open_meteo.py)
+variables = ["pm2_5", "pm10", "nitrogen_dioxide", "ozone"]
+
+# Taille cible d'une partition (octets) et nombre de lignes lues à la fois par un worker
+TAILLE_PARTITION = 64 * 1024 * 1024
+TAILLE_CHUNK = 500_000
+
+
+class _LecteurPlage(io.RawIOBase):
+    """
+    Fichier en lecture seule limité à la plage d'octets [debut, fin[.
+    Permet à pd.read_csv de lire une partition sans charger tout le fichier.
+    """
+
+    def __init__(self, chemin, debut, fin):
+        self._f = open(chemin, "rb")
+        self._f.seek(debut)
+        self._restant = fin - debut
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), self._restant)
+        if n <= 0:
+            return 0
+        data = self._f.read(n)
+        buffer[:len(data)] = data
+        self._restant -= len(data)
+        return len(data)
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+
+def decouper_fichier(chemin, taille_partition=TAILLE_PARTITION):
+    """
+    Découpe un CSV en plages d'octets alignées sur des fins de ligne.
+
+    :param chemin: chemin du fichier CSV (avec en-tête)
+    :param taille_partition: taille cible d'une partition en octets
+    :return: (liste des colonnes, liste de tuples (chemin, debut, fin))
+    """
+    taille = os.path.getsize(chemin)
+    with open(chemin, "rb") as f:
+        entete = f.readline()
+        colonnes = entete.decode("utf-8").strip().split(",")
+        debut = f.tell()
+        plages = []
+        while debut < taille:
+            f.seek(min(debut + taille_partition, taille))
+            f.readline()  # aller jusqu'à la fin de la ligne en cours
+            fin = min(f.tell(), taille)
+            plages.append((chemin, debut, fin))
+            debut = fin
+    return colonnes, plages
+
+
+def _agreger_plage(tache):
+    """
+    Worker : lit une plage du fichier par morceaux et renvoie les agrégats partiels
+    (sommes et effectifs par clé, comptages des valeurs pour les colonnes modales).
+    """
+    chemin, debut, fin, colonnes, cle, colonne_temps, variables, colonnes_mode, frequence, taille_chunk = tache
+
+    sommes = []
+    modes = {c: [] for c in colonnes_mode}
+    lecteur = io.BufferedReader(_LecteurPlage(chemin, debut, fin))
+    try:
+        chunks = pd.read_csv(lecteur, header=None, names=colonnes,
+                             usecols=[cle, colonne_temps] + variables + list(colonnes_mode),
+                             chunksize=taille_chunk)
+        for df in chunks:
+            # Horodatages ISO : année et mois extraits par découpage de chaîne, sans to_datetime
+            temps = df[colonne_temps].astype(str)
+            cles = [df[cle], temps.str[:4].astype(int).rename("year")]
+            if frequence == "M":
+                cles.append(temps.str[:7].rename("month"))
+
+            valeurs = df[variables].apply(pd.to_numeric, errors="coerce")
+            groupes = valeurs.groupby(cles)
+            partiel = groupes.sum().add_suffix("_sum").join(groupes.count().add_suffix("_count"))
+            sommes.append(partiel)
+
+            for c in colonnes_mode:
+                modes[c].append(df.groupby(cles + [df[c]]).size())
+    finally:
+        lecteur.close()
+
+    if not sommes:
+        return None, {}
+    sommes = pd.concat(sommes).groupby(level=list(range(len(cles)))).sum()
+    modes = {c: pd.concat(v).groupby(level=list(range(len(cles) + 1))).sum() for c, v in modes.items() if v}
+    return sommes, modes
+
+
+def agreger_fichiers(chemins, variables=variables, frequence="M", cle="country", colonne_temps="time",
+                     colonnes_mode=(), nb_processus=None, taille_partition=TAILLE_PARTITION,
+                     taille_chunk=TAILLE_CHUNK):
+    """
+    Agrège des CSV horaires (moyennes mensuelles ou annuelles) en parallèle.
+
+    Chaque fichier est découpé en partitions d'octets, chaque partition est lue par morceaux
+    dans un processus séparé puis les agrégats partiels (sommes/effectifs) sont fusionnés.
+    La mémoire utilisée par un worker est bornée par taille_chunk, quelle que soit la taille du fichier.
+
+    :param chemins: chemin ou liste de chemins de CSV horaires
+    :param variables: colonnes numériques à moyenner
+    :param frequence: "M" (country, year, month) ou "Y" (country, year)
+    :param cle: colonne de regroupement (pays)
+    :param colonne_temps: colonne horodatage au format ISO ("YYYY-MM-DD HH:MM:SS")
+    :param colonnes_mode: colonnes catégorielles dont on veut la valeur la plus fréquente
+    :param nb_processus: nombre de processus (par défaut : nombre de cœurs)
+    :param taille_partition: taille cible d'une partition en octets
+    :param taille_chunk: nombre de lignes lues à la fois par un worker
+    :return: DataFrame des moyennes (+ colonnes <col>_mode)
+    """
+    if frequence not in ("M", "Y"):
+        raise ValueError(f"Fréquence '{frequence}' non supportée (M ou Y).")
+    if isinstance(chemins, str):
+        chemins = [chemins]
+
+    variables = list(variables)
+    colonnes_mode = list(colonnes_mode)
+    taches = []
+    for chemin in chemins:
+        colonnes, plages = decouper_fichier(chemin, taille_partition)
+        for _, debut, fin in plages:
+            taches.append((chemin, debut, fin, colonnes, cle, colonne_temps, variables,
+                           colonnes_mode, frequence, taille_chunk))
+
+    niveaux = [cle, "year"] + (["month"] if frequence == "M" else [])
+    if not taches:
+        return pd.DataFrame(columns=niveaux + variables)
+
+    nb_processus = min(nb_processus or os.cpu_count() or 1, len(taches))
+    if nb_processus == 1:
+        resultats = list(map(_agreger_plage, taches))
+    else:
+        with ProcessPoolExecutor(max_workers=nb_processus) as pool:
+            resultats = list(pool.map(_agreger_plage, taches))
+
+    return _fusionner(resultats, niveaux, variables, colonnes_mode)
+
+
+def _agreger_lot(lot, cle, colonne_temps, variables, colonnes_mode, frequence):
+    """
+    Agrégats partiels d'un RecordBatch horaire, calculés par les noyaux Arrow (group_by) sur les buffers
+    du lot, sans passer par pandas ; seuls les agrégats (une ligne par clé) sont convertis.
+    """
+    temps = lot.column(colonne_temps)
+    colonnes = {cle: lot.column(cle), "year": pc.year(temps)}
+    if frequence == "M":
+        colonnes["month"] = pc.strftime(temps, format="%Y-%m")
+    niveaux = list(colonnes)
+    for v in variables:
+        # float32 → float64 pour les sommes ; NaN traités comme absents (comme pd.to_numeric + sum)
+        valeurs = lot.column(v).cast(pa.float64())
+        colonnes[v] = pc.if_else(pc.is_nan(valeurs), pa.scalar(None, pa.float64()), valeurs)
+    for c in colonnes_mode:
+        colonnes[c] = lot.column(c)
+    table = pa.table(colonnes)
+
+    partiel = (table.group_by(niveaux, use_threads=False)
+               .aggregate([(v, "sum") for v in variables] + [(v, "count") for v in variables])
+               .to_pandas().set_index(niveaux))
+    modes = {}
+    for c in colonnes_mode:
+        comptes = (table.filter(pc.is_valid(table[c])).group_by(niveaux + [c], use_threads=False)
+                   .aggregate([([], "count_all")]).to_pandas())
+        modes[c] = comptes.set_index(niveaux + [c])["count_all"]
+    return partiel, modes
+
+
+def agreger_ipc(nom, variables=variables, frequence="M", cle="country", colonne_temps="time",
+                colonnes_mode=(), dossier=dossier_arrow):
+    """
+    Agrège un dataset horaire Arrow (ex : air_quality_europe_horaire écrit par l'extraction), lot par lot.
+
+    Le fichier IPC est lu par mappage mémoire (lots_ipc) : les colonnes sont agrégées directement dans
+    les buffers du fichier, sans analyse de texte ni DataFrame intermédiaire. Même résultat qu'agreger_fichiers.
+
+    :param nom: nom du dataset (fichier <dossier>/<nom>.arrow)
+    :param variables: colonnes numériques à moyenner
+    :param frequence: "M" (country, year, month) ou "Y" (country, year)
+    :param cle: colonne de regroupement (pays)
+    :param colonne_temps: colonne horodatage (timestamp Arrow)
+    :param colonnes_mode: colonnes catégorielles dont on veut la valeur la plus fréquente
+    :return: DataFrame des moyennes (+ colonnes <col>_mode)
+    """
+    if frequence not in ("M", "Y"):
+        raise ValueError(f"Fréquence '{frequence}' non supportée (M ou Y).")
+    variables = list(variables)
+    colonnes_mode = list(colonnes_mode)
+    niveaux = [cle, "year"] + (["month"] if frequence == "M" else [])
+
+    resultats = [_agreger_lot(lot, cle, colonne_temps, variables, colonnes_mode, frequence)
+                 for lot in lots_ipc(nom, dossier) if lot.num_rows]
+    if not resultats:
+        return pd.DataFrame(columns=niveaux + variables)
+    return _fusionner(resultats, niveaux, variables, colonnes_mode)
+
+
+def _fusionner(resultats, niveaux, variables, colonnes_mode):
+    """Fusionne des agrégats partiels (sommes/effectifs, comptages des modes) en moyennes par clé."""
+    sommes = pd.concat([s for s, _ in resultats if s is not None]).groupby(level=niveaux).sum()
+    moyennes = pd.DataFrame(index=sommes.index)
+    for v in variables:
+        moyennes[v] = sommes[f"{v}_sum"] / sommes[f"{v}_count"].where(sommes[f"{v}_count"] > 0)
+
+    for c in colonnes_mode:
+        comptes = pd.concat([m[c] for _, m in resultats if c in m]).groupby(level=niveaux + [c]).sum()
+        # valeur la plus fréquente par clé (ex aequo : première par ordre alphabétique, comme Series.mode)
+        comptes = comptes.reset_index(name="n").sort_values(niveaux + ["n", c], ascending=[True] * len(niveaux) + [False, True])
+        mode = comptes.drop_duplicates(niveaux).set_index(niveaux)[c]
+        moyennes[f"{c}_mode"] = mode
+
+    return moyennes.reset_index().sort_values(niveaux, ignore_index=True)
+
+
+if __name__ == "__main__":
+    dossier_csv = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fichier_csv")
+    chemin = os.path.join(dossier_csv, "air_quality_europe.csv")
+
+    # Séries horaires Arrow de l'extraction si présentes, sinon le CSV horaire
+    if os.path.exists(os.path.join(dossier_arrow, "air_quality_europe_horaire.arrow")):
+        mensuel = agreger_ipc("air_quality_europe_horaire", frequence="M")
+        annuel = agreger_ipc("air_quality_europe_horaire", frequence="Y")
+    else:
+        mensuel = agreger_fichiers(chemin, frequence="M")
+        annuel = agreger_fichiers(chemin, frequence="Y")
+    mensuel.to_csv("air_quality_europe_monthly_avg_parallele.csv", index=False)
+    print(f"✅ Moyennes mensuelles : {len(mensuel)} lignes → air_quality_europe_monthly_avg_parallele.csv")
+
+    annuel.to_csv("air_quality_europe_yearly_avg_parallele.csv", index=False)
+    print(f"✅ Moyennes annuelles : {len(annuel)} lignes → air_quality_europe_yearly_avg_parallele.csv")
@@ -0,0 +1,214 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+
+dossier_cubes = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fichier_csv", "cube")
+
+UNE_HEURE = np.timedelta64(1, "h")
+# Les emplacements sont alloués par blocs pour ne pas remapper le fichier à chaque nouveau pays
+BLOC_LOCATIONS = 16
+# Extension minimale de l'axe du temps (1 an)
+BLOC_HEURES = 366 * 24
+
+
+class CubeHoraire:
+    """
+    Cube binaire location × heure × variable (float32) stocké dans un np.memmap.
+
+    Le dossier du cube contient valeurs.f32 (données brutes, NaN = absent) et index.json
+    (origine du temps, nombre d'heures, variables, locations). La position d'une mesure est
+    calculée arithmétiquement : aucune analyse de texte à la lecture.
+    """
+
+    def __init__(self, dossier, variables=None, origine=None):
+        """
+        :param dossier: dossier du cube (créé si besoin)
+        :param variables: variables du cube (obligatoire à la création)
+        :param origine: première heure du cube, ex "2023-01-01" (obligatoire à la création)
+        """
+        self.dossier = dossier
+        self.chemin_index = os.path.join(dossier, "index.json")
+        self.chemin_valeurs = os.path.join(dossier, "valeurs.f32")
+
+        if os.path.exists(self.chemin_index):
+            with open(self.chemin_index, encoding="utf-8") as f:
+                index = json.load(f)
+            self.origine = np.datetime64(index["origine"], "h")
+            self.heures = index["heures"]
+            self.variables = index["variables"]
+            self.locations = index["locations"]
+            self.capacite = index["capacite"]
+            if variables is not None and list(variables) != self.variables:
+                self._redimensionner(self.origine, self.heures, self.variables + [v for v in variables
+                                                                                 if v not in self.variables])
+        else:
+            if variables is None or origine is None:
+                raise ValueError(f"Cube inexistant dans {dossier} : variables et origine requises.")
+            os.makedirs(dossier, exist_ok=True)
+            self.origine = np.datetime64(origine, "h")
+            self.heures = BLOC_HEURES
+            self.variables = list(variables)
+            self.locations = []
+            self.capacite = 0
+            self._allouer(self.chemin_valeurs, BLOC_LOCATIONS, self.heures, len(self.variables))
+            self.capacite = BLOC_LOCATIONS
+            self._sauvegarder_index()
+
+        self._ouvrir()
+
+    # --- Stockage ---
+
+    def _allouer(self, chemin, capacite, heures, nb_variables):
+        m = np.memmap(chemin, dtype=np.float32, mode="w+", shape=(capacite, heures, nb_variables))
+        m[:] = np.nan
+        m.flush()
+        del m
+
+    def _ouvrir(self):
+        self.valeurs = np.memmap(self.chemin_valeurs, dtype=np.float32, mode="r+",
+                                 shape=(self.capacite, self.heures, len(self.variables)))
+
+    def _sauvegarder_index(self):
+        index = {
+            "origine": str(self.origine),
+            "heures": self.heures,
+            "variables": self.variables,
+            "locations": self.locations,
+            "capacite": self.capacite,
+        }
+        tmp = self.chemin_index + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp, self.chemin_index)
+
+    def _redimensionner(self, origine, heures, variables, capacite=None):
+        """Réécrit le cube avec un nouvel axe du temps et/ou de nouvelles variables (opération rare)."""
+        capacite = capacite or self.capacite
+        ancien = np.memmap(self.chemin_valeurs, dtype=np.float32, mode="r",
+                           shape=(self.capacite, self.heures, len(self.variables)))
+        tmp = self.chemin_valeurs + ".tmp"
+        self._allouer(tmp, capacite, heures, len(variables))
+        nouveau = np.memmap(tmp, dtype=np.float32, mode="r+", shape=(capacite, heures, len(variables)))
+
+        decalage = int((self.origine - origine) / UNE_HEURE)
+        colonnes = [variables.index(v) for v in self.variables]
+        for i in range(len(self.locations)):
+            nouveau[i][decalage:decalage + self.heures, colonnes] = ancien[i]
+        nouveau.flush()
+        del nouveau, ancien
+        self.valeurs = None
+        os.replace(tmp, self.chemin_valeurs)
+
+        self.origine, self.heures, self.variables, self.capacite = origine, heures, list(variables), capacite
+        self._sauvegarder_index()
+        self._ouvrir()
+
+    def _location(self, nom):
+        """Indice d'une location, ajoutée si nouvelle (le fichier grandit par blocs)."""
+        if nom in self.locations:
+            return self.locations.index(nom)
+        if len(self.locations) == self.capacite:
+            self.valeurs.flush()
+            self.valeurs = None
+            taille_bloc = BLOC_LOCATIONS * self.heures * len(self.variables)
+            with open(self.chemin_valeurs, "ab") as f:
+                f.write(np.full(taille_bloc, np.nan, dtype=np.float32).tobytes())
+            self.capacite += BLOC_LOCATIONS
+            self._ouvrir()
+        self.locations.append(nom)
+        self._sauvegarder_index()
+        return len(self.locations) - 1
+
+    # --- Écriture ---
+
+    def ecrire(self, location, temps, valeurs):
+        """
+        Écrit des mesures horaires pour une location (écriture incrémentale, les autres cases sont inchangées).
+
+        :param location: nom de la location (ex : pays)
+        :param temps: horodatages (array-like convertible en datetime64)
+        :param valeurs: DataFrame ou dict {variable: array} alignés sur temps
+        """
+        t = np.asarray(pd.to_datetime(temps).values, dtype="datetime64[h]")
+        if len(t) == 0:
+            return
+        variables = list(valeurs.keys()) if isinstance(valeurs, dict) else list(valeurs.columns)
+        nouvelles = [v for v in variables if v not in self.variables]
+
+        debut, fin = t.min(), t.max()
+        origine = min(self.origine, debut)
+        heures = self.heures + int((self.origine - origine) / UNE_HEURE)
+        besoin = int((fin - origine) / UNE_HEURE) + 1
+        if besoin > heures:
+            heures = besoin + BLOC_HEURES
+        if nouvelles or origine != self.origine or heures != self.heures:
+            self._redimensionner(origine, heures, self.variables + nouvelles)
+
+        i = self._location(location)
+        positions = ((t - self.origine) / UNE_HEURE).astype(np.int64)
+        for v in variables:
+            self.valeurs[i, positions, self.variables.index(v)] = np.asarray(valeurs[v], dtype=np.float32)
+        self.valeurs.flush()
+
+    # --- Lecture ---
+
+    def _position(self, date):
+        return int(np.clip((np.datetime64(date, "h") - self.origine) / UNE_HEURE, 0, self.heures))
+
+    def lire(self, location, variable, debut=None, fin=None):
+        """
+        Tranche (vue sur le fichier mappé, sans copie) d'une variable pour une location.
+
+        :return: (horodatages, valeurs)
+        """
+        i = self.locations.index(location)
+        a = self._position(debut) if debut is not None else 0
+        b = self._position(fin) if fin is not None else self.heures
+        temps = self.origine + np.arange(a, b) * UNE_HEURE
+        return temps, self.valeurs[i, a:b, self.variables.index(variable)]
+
+    def vers_dataframe(self, location, debut=None, fin=None):
+        """DataFrame horaire time, <variables> d'une location."""
+        i = self.locations.index(location)
+        a = self._position(debut) if debut is not None else 0
+        b = self._position(fin) if fin is not None else self.heures
+        df = pd.DataFrame(np.asarray(self.valeurs[i, a:b]), columns=self.variables)
+        df.insert(0, "time", self.origine + np.arange(a, b) * UNE_HEURE)
+        return df.dropna(how="all", subset=self.variables)
+
+    def moyennes_mensuelles(self, variables=None):
+        """
+        Moyennes mensuelles de toutes les locations, calculées par np.add.reduceat sur l'axe des heures
+        directement sur le fichier mappé (sommes et effectifs hors NaN).
+
+        :return: DataFrame country, year, month, <variables> (même format que les CSV mensuels)
+        """
+        variables = variables or self.variables
+        n = len(self.locations)
+        mois_debut = self.origine.astype("datetime64[M]")
+        mois_fin = (self.origine + (self.heures - 1) * UNE_HEURE).astype("datetime64[M]")
+        mois = np.arange(mois_debut, mois_fin + 1)
+        bornes = ((mois.astype("datetime64[h]") - self.origine) / UNE_HEURE).astype(np.int64).clip(0)
+
+        resultat = {}
+        effectif_total = None
+        for v in variables:
+            donnees = self.valeurs[:n, :, self.variables.index(v)]
+            valide = ~np.isnan(donnees)
+            sommes = np.add.reduceat(np.where(valide, donnees, 0.0), bornes, axis=1, dtype=np.float64)
+            effectifs = np.add.reduceat(valide, bornes, axis=1, dtype=np.int64)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                resultat[v] = (sommes / effectifs).ravel()
+            effectif_total = effectifs if effectif_total is None else effectif_total + effectifs
+
+        df = pd.DataFrame({
+            "country": np.repeat(self.locations, len(mois)),
+            "year": np.tile(mois.astype("datetime64[Y]").astype(int) + 1970, n),
+            "month": np.tile(mois.astype(str), n),
+            **resultat,
+        })
+        # mois sans aucune mesure retirés
+        return df[effectif_total.ravel() > 0].reset_index(drop=True)
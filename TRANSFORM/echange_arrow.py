@@ -0,0 +1,176 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+
+
+# Fichiers IPC (Feather v2) échangés entre EXTRACT, TRANSFORM et LOAD
+dossier_arrow = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fichier_csv", "arrow")
+
+VARIABLES_QUALITE_AIR = ["pm2_5", "pm10", "nitrogen_dioxide", "ozone"]
+VARIABLES_METEO = ["temperature_2m", "cloudcover", "weathercode"]
+
+# Colonnes clés : le mois est une date (1er du mois) et non plus une chaîne "AAAA-MM"
+_CLES_MENSUELLES = [
+    pa.field("country", pa.string(), nullable=False),
+    pa.field("year", pa.int16(), nullable=False),
+    pa.field("month", pa.date32(), nullable=False),
+]
+_CLES_HORAIRES = [
+    pa.field("time", pa.timestamp("s"), nullable=False),
+    pa.field("country", pa.string(), nullable=False),
+    pa.field("year", pa.int16(), nullable=False),
+]
+
+# Schéma explicite de chaque dataset échangé (séries horaires en float32 comme à la source,
+# moyennes mensuelles en float64 comme les CSV publiés)
+SCHEMAS = {
+    "air_quality_europe_monthly_avg": pa.schema(
+        _CLES_MENSUELLES + [pa.field(v, pa.float64()) for v in VARIABLES_QUALITE_AIR]),
+    "europe_weather_monthly_avg": pa.schema(
+        _CLES_MENSUELLES + [pa.field("temperature_2m", pa.float64()), pa.field("cloudcover", pa.float64()),
+                            pa.field("weather_description_mode", pa.string())]),
+    "air_quality_europe_horaire": pa.schema(
+        _CLES_HORAIRES + [pa.field(v, pa.float32()) for v in VARIABLES_QUALITE_AIR]),
+    "europe_weather_horaire": pa.schema(
+        _CLES_HORAIRES + [pa.field(v, pa.float32()) for v in VARIABLES_METEO]
+        + [pa.field("weather_description", pa.string())]),
+}
+
+# Datasets envoyés dans l'entrepôt par LOAD/fichier_un.py (les séries horaires restent locales)
+DATASETS_CHARGES = ["air_quality_europe_monthly_avg", "europe_weather_monthly_avg"]
+
+
+def schema(nom):
+    if nom not in SCHEMAS:
+        raise ValueError(f"Dataset '{nom}' sans schéma Arrow déclaré (voir SCHEMAS).")
+    return SCHEMAS[nom]
+
+
+def chemin_dataset(nom, dossier=dossier_arrow):
+    return os.path.join(dossier, f"{nom}.arrow")
+
+
+def _colonne(valeurs, champ):
+    """Convertit une colonne (Series, ndarray, liste ou scalaire) vers le type du champ."""
+    if isinstance(valeurs, pd.Series):
+        if isinstance(valeurs.dtype, pd.PeriodDtype):
+            valeurs = valeurs.dt.to_timestamp()
+        elif pa.types.is_temporal(champ.type) and valeurs.dtype == object:
+            valeurs = pd.to_datetime(valeurs)
+        if pa.types.is_date32(champ.type):
+            valeurs = valeurs.to_numpy(dtype="datetime64[D]")
+    tableau = pa.array(valeurs, from_pandas=True)
+    return tableau if tableau.type == champ.type else tableau.cast(champ.type)
+
+
+def vers_batch(donnees, nom):
+    """
+    Construit un RecordBatch conforme au schéma du dataset.
+
+    Les tableaux NumPy déjà au bon type (ex : float32 de decodage_open_meteo) sont repris sans copie.
+    Les colonnes hors schéma sont ignorées ; les colonnes clés (non nullables) ne doivent pas contenir de nul.
+
+    :param donnees: DataFrame ou dict {colonne: tableau ou scalaire}
+    :param nom: nom du dataset (clé de SCHEMAS)
+    """
+    s = schema(nom)
+    n = len(donnees) if isinstance(donnees, pd.DataFrame) else \
+        max(len(v) for v in donnees.values() if np.ndim(v) > 0)
+    colonnes = []
+    for champ in s:
+        if champ.name not in donnees:
+            if not champ.nullable:
+                raise ValueError(f"{nom} : colonne obligatoire '{champ.name}' absente")
+            colonnes.append(pa.nulls(n, type=champ.type))
+            continue
+        valeurs = donnees[champ.name]
+        if np.ndim(valeurs) == 0 and not isinstance(valeurs, pd.Series):
+            valeurs = np.full(n, valeurs)
+        colonne = _colonne(valeurs, champ)
+        if not champ.nullable and colonne.null_count:
+            raise ValueError(f"{nom} : {colonne.null_count} valeurs nulles dans la colonne clé '{champ.name}'")
+        colonnes.append(colonne)
+    return pa.RecordBatch.from_arrays(colonnes, schema=s)
+
+
+class EcrivainIPC:
+    """
+    Écriture incrémentale d'un dataset au format IPC (fichier Arrow / Feather v2), un lot à la fois.
+    Le fichier n'apparaît sous son nom définitif qu'à la fermeture (écriture dans un .tmp puis renommage).
+
+        with EcrivainIPC("air_quality_europe_horaire") as ecrivain:
+            ecrivain.ecrire({"time": ..., "country": "France", "year": 2024, "pm2_5": ...})
+    """
+
+    def __init__(self, nom, dossier=dossier_arrow):
+        self.nom = nom
+        self.schema = schema(nom)
+        self.chemin = chemin_dataset(nom, dossier)
+        os.makedirs(dossier, exist_ok=True)
+        self._tmp = self.chemin + ".tmp"
+        self._writer = pa.ipc.new_file(self._tmp, self.schema)
+        self.lignes = 0
+
+    def ecrire(self, donnees):
+        """Ajoute un lot (RecordBatch, Table, DataFrame ou dict de colonnes)."""
+        if isinstance(donnees, pa.Table):
+            self._writer.write_table(donnees.cast(self.schema))
+            self.lignes += donnees.num_rows
+            return
+        batch = donnees if isinstance(donnees, pa.RecordBatch) else vers_batch(donnees, self.nom)
+        self._writer.write_batch(batch)
+        self.lignes += batch.num_rows
+
+    def fermer(self):
+        self._writer.close()
+        os.replace(self._tmp, self.chemin)
+        return self.chemin
+
+    def abandonner(self):
+        self._writer.close()
+        os.remove(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.fermer()
+        else:
+            self.abandonner()
+
+
+def ecrire_ipc(donnees, nom, dossier=dossier_arrow):
+    """Écrit un dataset complet (DataFrame, RecordBatch, Table ou liste de lots) ; renvoie le chemin."""
+    with EcrivainIPC(nom, dossier) as ecrivain:
+        for lot in (donnees if isinstance(donnees, list) else [donnees]):
+            ecrivain.ecrire(lot)
+    return ecrivain.chemin
+
+
+def lire_ipc(nom, dossier=dossier_arrow):
+    """
+    Table Arrow d'un dataset, lue par mappage mémoire : les buffers pointent dans le fichier (aucune copie).
+    Le schéma lu est vérifié contre le schéma déclaré.
+    """
+    chemin = chemin_dataset(nom, dossier)
+    table = pa.ipc.open_file(pa.memory_map(chemin, "r")).read_all()
+    if nom in SCHEMAS and not table.schema.equals(SCHEMAS[nom]):
+        raise ValueError(f"{chemin} : schéma différent du schéma déclaré pour {nom}")
+    return table
+
+
+def lots_ipc(nom, dossier=dossier_arrow):
+    """Itère sur les RecordBatch d'un dataset sans charger le fichier entier."""
+    lecteur = pa.ipc.open_file(pa.memory_map(chemin_dataset(nom, dossier), "r"))
+    for i in range(lecteur.num_record_batches):
+        yield lecteur.get_batch(i)
+
+
+def datasets_disponibles(dossier=dossier_arrow):
+    if not os.path.isdir(dossier):
+        return []
+    return sorted(f[:-len(".arrow")] for f in os.listdir(dossier) if f.endswith(".arrow"))
@@ -0,0 +1,200 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+dossier_evaluation = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fichier_csv", "evaluation_previsions")
+
+# Nombre de jours de prévision capturés par api_aqicn/aqicn.py
+NB_JOURS_PREVISION = 2
+
+# Seuils US EPA PM2.5 (µg/m³ → indice AQI), utilisés pour comparer OpenAQ / Open-Meteo aux prévisions AQICN
+SEUILS_PM25 = np.array([0.0, 12.0, 35.4, 55.4, 150.4, 250.4, 350.4, 500.4])
+SEUILS_AQI = np.array([0.0, 50.0, 100.0, 150.0, 200.0, 300.0, 400.0, 500.0])
+
+COLONNES_STATS = ["n", "somme_erreur", "somme_abs", "somme_carre"]
+
+# Échéance minimale évaluée (jours après le snapshot)
+ECHEANCE_MIN = 1
+
+
+def concentration_vers_aqi_pm25(concentration):
+    """Convertit des concentrations PM2.5 (µg/m³) en indice AQI (interpolation linéaire par tranche, vectorisé)."""
+    return np.interp(np.asarray(concentration, dtype=float), SEUILS_PM25, SEUILS_AQI)
+
+
+def _empiler(ancien, nouveau):
+    """Concatène deux DataFrames en ignorant un historique encore vide (évite les dtypes object des tables vides)."""
+    return nouveau if ancien.empty else pd.concat([ancien, nouveau], ignore_index=True)
+
+
+def pays_depuis_nom(noms):
+    """Pays d'une station AQICN : dernier élément de "Ville, Pays" (vectorisé)."""
+    return pd.Series(noms, dtype="object").fillna("").str.rsplit(",", n=1).str[-1].str.strip()
+
+
+class EvaluateurPrevisions:
+    """
+    Évaluation incrémentale des prévisions PM2.5 AQICN.
+
+    Chaque snapshot (CSV produit par api_aqicn/aqicn.py) apporte :
+      - des observations iaqi_pm25 à la date time_s, moyennées par station et par jour ;
+      - des prévisions forecast_pm25_dayN_avg (échéance = jour cible - jour du snapshot).
+    aqicn.py ne garde que les jours de forecast.daily.pm25 postérieurs au relevé (day1 = J+1, day2 = J+2) ;
+    par sécurité, les lignes d'échéance < ECHEANCE_MIN (anciens snapshots) sont encore écartées.
+    Une prévision est évaluée dès que son jour cible est terminé (un snapshot plus récent existe) et observé.
+    Les statistiques (n, somme des erreurs, des |erreurs|, des erreurs²) sont cumulées par (station, échéance),
+    ce qui permet de dériver MAE / RMSE / biais par station, pays ou échéance.
+    """
+
+    def __init__(self):
+        self.observations = pd.DataFrame(columns=["station", "jour", "somme", "n"])
+        self.en_attente = pd.DataFrame(columns=["station", "pays", "jour", "echeance", "prevision"])
+        self.stats = pd.DataFrame(columns=["station", "pays", "echeance"] + COLONNES_STATS)
+        self.dernier_jour = None
+
+    # --- Ingestion ---
+
+    def ajouter_snapshot(self, snapshot):
+        """
+        Ajoute un snapshot AQICN (DataFrame aux colonnes de resultats_stations_detail_histo.csv)
+        puis évalue les prévisions devenues évaluables.
+        """
+        df = snapshot.dropna(subset=["idx", "time_s"])
+        jour_obs = pd.to_datetime(df["time_s"], errors="coerce").dt.normalize()
+        station = df["idx"].astype(int).to_numpy()
+        pays = pays_depuis_nom(df["station_name"].to_numpy()).to_numpy()
+
+        obs = pd.DataFrame({"station": station, "jour": jour_obs,
+                            "valeur": pd.to_numeric(df["iaqi_pm25"], errors="coerce")}).dropna()
+        self.ajouter_observations(obs)
+
+        # Prévisions des jours 1..N : un tableau par jour empilé en une seule passe
+        previsions = []
+        for k in range(1, NB_JOURS_PREVISION + 1):
+            cible = pd.to_datetime(df[f"forecast_pm25_day{k}_date"], errors="coerce")
+            previsions.append(pd.DataFrame({
+                "station": station,
+                "pays": pays,
+                "jour": cible,
+                "echeance": (cible - jour_obs).dt.days,
+                "prevision": pd.to_numeric(df[f"forecast_pm25_day{k}_avg"], errors="coerce"),
+            }))
+        previsions = pd.concat(previsions, ignore_index=True).dropna()
+        # jours passés ou jour même : valeurs déjà (partiellement) observées, pas des prévisions
+        previsions = previsions[previsions["echeance"] >= ECHEANCE_MIN]
+        # une seule prévision par (station, jour cible, échéance) : la plus récente l'emporte
+        self.en_attente = (_empiler(self.en_attente, previsions)
+                           .drop_duplicates(["station", "jour", "echeance"], keep="last"))
+
+        jour_max = jour_obs.max()
+        if pd.notna(jour_max) and (self.dernier_jour is None or jour_max > self.dernier_jour):
+            self.dernier_jour = jour_max
+        self.evaluer()
+
+    def ajouter_observations(self, obs):
+        """
+        Ajoute des observations (station, jour, valeur en indice AQI), ex. OpenAQ / Open-Meteo
+        rattachées aux stations AQICN et converties avec concentration_vers_aqi_pm25.
+        """
+        if obs.empty:
+            return
+        nouvelles = obs.assign(jour=pd.to_datetime(obs["jour"]).dt.normalize()) \
+            .groupby(["station", "jour"])["valeur"].agg(somme="sum", n="count").reset_index()
+        self.observations = (_empiler(self.observations, nouvelles)
+                             .groupby(["station", "jour"], as_index=False)[["somme", "n"]].sum())
+
+    # --- Évaluation ---
+
+    def evaluer(self):
+        """Évalue en bloc toutes les prévisions en attente dont le jour cible est terminé et observé."""
+        if self.dernier_jour is None or self.en_attente.empty:
+            return 0
+        if self.observations.empty:
+            return 0
+        obs = self.observations[self.observations["jour"] < self.dernier_jour]
+        jointure = self.en_attente.merge(obs, on=["station", "jour"], how="left", indicator=True)
+        evaluable = (jointure["_merge"] == "both").to_numpy()
+        if not evaluable.any():
+            return 0
+
+        lot = jointure[evaluable]
+        erreur = lot["prevision"].to_numpy(float) - (lot["somme"].to_numpy(float) / lot["n"].to_numpy(float))
+
+        # Cumuls par (station, échéance) via np.bincount sur des codes factorisés
+        codes, groupes = pd.MultiIndex.from_arrays([lot["station"], lot["pays"], lot["echeance"]]).factorize()
+        taille = len(groupes)
+        nouvelles = pd.DataFrame({
+            "station": groupes.get_level_values(0),
+            "pays": groupes.get_level_values(1),
+            "echeance": groupes.get_level_values(2),
+            "n": np.bincount(codes, minlength=taille),
+            "somme_erreur": np.bincount(codes, weights=erreur, minlength=taille),
+            "somme_abs": np.bincount(codes, weights=np.abs(erreur), minlength=taille),
+            "somme_carre": np.bincount(codes, weights=erreur * erreur, minlength=taille),
+        })
+        self.stats = (_empiler(self.stats, nouvelles)
+                      .groupby(["station", "pays", "echeance"], as_index=False)[COLONNES_STATS].sum())
+
+        # Retirer les prévisions évaluées ; les jours cibles passés sans observation sont abandonnés
+        jours_restants = jointure["jour"] >= self.dernier_jour
+        self.en_attente = jointure.loc[~evaluable & jours_restants.to_numpy(), self.en_attente.columns] \
+            .reset_index(drop=True)
+        # Les observations antérieures à la plus ancienne prévision en attente ne servent plus
+        jour_min = self.en_attente["jour"].min() if not self.en_attente.empty else self.dernier_jour
+        self.observations = self.observations[self.observations["jour"] >= jour_min].reset_index(drop=True)
+        return int(evaluable.sum())
+
+    def scores(self, par=("station", "echeance")):
+        """
+        MAE, RMSE et biais (prévision - observation) agrégés selon les colonnes demandées.
+
+        :param par: sous-ensemble de ("station", "pays", "echeance")
+        """
+        par = list(par)
+        s = self.stats.groupby(par, as_index=False)[COLONNES_STATS].sum()
+        n = s["n"].to_numpy(float)
+        return s[par].assign(
+            n=s["n"].astype(int),
+            mae=s["somme_abs"].to_numpy(float) / n,
+            rmse=np.sqrt(s["somme_carre"].to_numpy(float) / n),
+            biais=s["somme_erreur"].to_numpy(float) / n,
+        )
+
+    # --- Persistance ---
+
+    def sauvegarder(self, dossier=dossier_evaluation):
+        os.makedirs(dossier, exist_ok=True)
+        self.observations.to_csv(os.path.join(dossier, "observations.csv"), index=False)
+        self.en_attente.to_csv(os.path.join(dossier, "en_attente.csv"), index=False)
+        self.stats.to_csv(os.path.join(dossier, "stats.csv"), index=False)
+
+    @classmethod
+    def charger(cls, dossier=dossier_evaluation):
+        evaluateur = cls()
+        if not os.path.exists(os.path.join(dossier, "stats.csv")):
+            return evaluateur
+        evaluateur.observations = pd.read_csv(os.path.join(dossier, "observations.csv"), parse_dates=["jour"])
+        evaluateur.en_attente = pd.read_csv(os.path.join(dossier, "en_attente.csv"), parse_dates=["jour"],
+                                            keep_default_na=False)
+        evaluateur.stats = pd.read_csv(os.path.join(dossier, "stats.csv"), keep_default_na=False)
+        if not evaluateur.observations.empty:
+            evaluateur.dernier_jour = evaluateur.observations["jour"].max()
+        return evaluateur
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Usage : python evaluation_previsions.py snapshot1.csv [snapshot2.csv ...]
+    evaluateur = EvaluateurPrevisions.charger()
+    for chemin in sys.argv[1:]:
+        evaluateur.ajouter_snapshot(pd.read_csv(chemin))
+        print(f"Snapshot ajouté : {chemin}")
+    evaluateur.sauvegarder()
+
+    print("\nScores par échéance :")
+    print(evaluateur.scores(par=["echeance"]).round(2).to_string(index=False))
+    print("\nScores par pays et échéance :")
+    print(evaluateur.scores(par=["pays", "echeance"]).round(2).to_string(index=False))
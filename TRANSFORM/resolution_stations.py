@@ -0,0 +1,269 @@
+import os
+import re
+import math
+import unicodedata
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+
+
+# Table de correspondance persistée : (source, id_source) → id_canonique
+chemin_correspondances = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fichier_csv",
+                                      "stations_canoniques.csv")
+
+COLONNES = ["id_canonique", "source", "id_source", "nom", "latitude", "longitude", "score"]
+
+# Distance maximale entre deux descriptions d'un même site (km)
+RAYON_KM = 2.0
+# Score minimal pour rattacher une station à un site existant
+SEUIL = 0.6
+# Pondération du score : similarité des noms / proximité
+POIDS_NOM = 0.6
+POIDS_DISTANCE = 0.4
+# Similarité attribuée quand une des deux stations n'a pas de nom (points Open-Meteo) :
+# le rattachement ne se fait alors que sur une distance très courte
+SIMILARITE_SANS_NOM = 0.5
+
+KM_PAR_DEGRE = 111.195
+# Cellules du hachage spatial : hauteur = RAYON_KM, largeur élargie pour rester valable jusqu'à 72°N
+PAS_LAT = RAYON_KM / KM_PAR_DEGRE
+PAS_LON = PAS_LAT / math.cos(math.radians(72))
+
+# Mots sans valeur discriminante dans les noms de stations
+MOTS_VIDES = {"de", "du", "des", "la", "le", "les", "l", "d", "station", "rue", "avenue", "str", "strasse",
+              "via", "calle", "the", "of"}
+
+
+def normaliser_nom(nom):
+    """Nom en minuscules, sans accents ni ponctuation, découpé en mots (mots vides retirés)."""
+    if not isinstance(nom, str) or not nom:
+        return ()
+    texte = unicodedata.normalize("NFKD", nom).encode("ascii", "ignore").decode().lower()
+    return tuple(m for m in re.split(r"[^a-z0-9]+", texte) if m and m not in MOTS_VIDES)
+
+
+def similarite_noms(a, b):
+    """
+    Similarité de deux noms normalisés (0..1) : maximum entre le recouvrement des mots
+    (|A∩B| / min(|A|, |B|), tolérant aux suffixes "Ville, Pays" d'AQICN) et le ratio de
+    SequenceMatcher sur les mots triés (tolérant aux fautes et abréviations).
+    """
+    if not a or not b:
+        return SIMILARITE_SANS_NOM
+    sa, sb = set(a), set(b)
+    recouvrement = len(sa & sb) / min(len(sa), len(sb))
+    ratio = SequenceMatcher(None, " ".join(sorted(sa)), " ".join(sorted(sb))).ratio()
+    return max(recouvrement, ratio)
+
+
+def distance_km(lat, lon, lats, lons):
+    """Distance haversine (km) d'un point à un tableau de points."""
+    lat, lon, lats, lons = map(np.radians, (lat, lon, np.asarray(lats, float), np.asarray(lons, float)))
+    h = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * 6371.0 * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+def cellule(latitude, longitude):
+    return math.floor(latitude / PAS_LAT), math.floor(longitude / PAS_LON)
+
+
+# --- Mise au format commun des stations de chaque source ---
+
+def depuis_openaq(capteurs):
+    """Locations OpenAQ (liste renvoyée par openaq_api.get_country_sensors ou RegistreOpenAQ.capteurs)."""
+    df = pd.DataFrame(capteurs)
+    if df.empty:
+        return pd.DataFrame(columns=["source", "id_source", "nom", "latitude", "longitude"])
+    df = df.drop_duplicates("location_id")
+    return pd.DataFrame({
+        "source": "openaq",
+        "id_source": df["location_id"].astype(str),
+        "nom": df["location_name"],
+        "latitude": df["latitude"],
+        "longitude": df["longitude"],
+    })
+
+
+def depuis_aqicn(stations):
+    """Stations AQICN (liste renvoyée par api_aqicn/aqicn.py get_stations_in_bounds, endpoint map/bounds)."""
+    lignes = [{
+        "source": "aqicn",
+        "id_source": str(s.get("uid")),
+        "nom": (s.get("station") or {}).get("name"),
+        "latitude": s.get("lat"),
+        "longitude": s.get("lon"),
+    } for s in stations]
+    return pd.DataFrame(lignes, columns=["source", "id_source", "nom", "latitude", "longitude"])
+
+
+def depuis_open_meteo(points):
+    """Points Open-Meteo (DataFrame country, latitude, longitude, ex : grille_pays) : identifiés par leurs coordonnées."""
+    lat = points["latitude"].astype(float).round(4)
+    lon = points["longitude"].astype(float).round(4)
+    return pd.DataFrame({
+        "source": "open_meteo",
+        "id_source": lat.map("{:.4f}".format) + "," + lon.map("{:.4f}".format),
+        "nom": None,
+        "latitude": lat,
+        "longitude": lon,
+    })
+
+
+class ResolveurStations:
+    """
+    Résolution des stations entre sources (OpenAQ, AQICN, Open-Meteo).
+
+    Chaque station (source, id_source) reçoit un identifiant canonique de site. Les candidats sont
+    limités par un hachage spatial (cellules de RAYON_KM, voisinage 3×3) puis classés par un score
+    mêlant similarité des noms et distance. Une station ne peut rejoindre un site qui a déjà une
+    station de la même source. La table est persistée et seules les nouvelles stations sont résolues
+    à chaque appel ; les recherches en aval se font ensuite par clé (source, id_source).
+    """
+
+    def __init__(self, chemin=chemin_correspondances):
+        self.chemin = chemin
+        if os.path.exists(chemin):
+            self.table = pd.read_csv(chemin, dtype={"id_canonique": str, "source": str, "id_source": str},
+                                     keep_default_na=False, na_values={"latitude": [""], "longitude": [""],
+                                                                       "score": [""]})
+        else:
+            self.table = pd.DataFrame(columns=COLONNES)
+        self._indexer()
+
+    def _indexer(self):
+        """Reconstruit les index en mémoire (clé source → site, sites par cellule, sources par site)."""
+        self._par_cle = dict(zip(zip(self.table["source"], self.table["id_source"]), self.table["id_canonique"]))
+        self._sites = {}  # id_canonique → {"latitude", "longitude", "noms": [...], "sources": set()}
+        self._par_cellule = {}
+        for ligne in self.table.itertuples(index=False):
+            self._rattacher(ligne.id_canonique, ligne.source, ligne.nom, ligne.latitude, ligne.longitude)
+        self._prochain = 1 + max((int(i[1:]) for i in self._sites), default=0)
+
+    def _rattacher(self, id_canonique, source, nom, latitude, longitude):
+        site = self._sites.get(id_canonique)
+        if site is None:
+            # la position du site est celle de sa première station
+            site = self._sites[id_canonique] = {"latitude": latitude, "longitude": longitude,
+                                                "noms": [], "sources": set()}
+            self._par_cellule.setdefault(cellule(latitude, longitude), []).append(id_canonique)
+        site["sources"].add(source)
+        mots = normaliser_nom(nom)
+        if mots:
+            site["noms"].append(mots)
+
+    def _candidats(self, latitude, longitude, source):
+        i, j = cellule(latitude, longitude)
+        return [s for di in (-1, 0, 1) for dj in (-1, 0, 1)
+                for s in self._par_cellule.get((i + di, j + dj), []) if source not in self._sites[s]["sources"]]
+
+    def _meilleur_site(self, source, nom, latitude, longitude):
+        candidats = self._candidats(latitude, longitude, source)
+        if not candidats:
+            return None, 0.0
+        sites = [self._sites[c] for c in candidats]
+        distances = distance_km(latitude, longitude, [s["latitude"] for s in sites], [s["longitude"] for s in sites])
+        mots = normaliser_nom(nom)
+        meilleur, meilleur_score = None, 0.0
+        for c, site, d in zip(candidats, sites, distances):
+            if d > RAYON_KM:
+                continue
+            sim = max((similarite_noms(mots, n) for n in site["noms"]), default=SIMILARITE_SANS_NOM)
+            score = POIDS_NOM * sim + POIDS_DISTANCE * (1 - d / RAYON_KM)
+            if score > meilleur_score:
+                meilleur, meilleur_score = c, score
+        return (meilleur, meilleur_score) if meilleur_score >= SEUIL else (None, 0.0)
+
+    def resoudre(self, stations):
+        """
+        Rattache les nouvelles stations à un site existant ou crée un nouveau site.
+
+        :param stations: DataFrame source, id_source, nom, latitude, longitude (voir depuis_openaq / depuis_aqicn /
+                         depuis_open_meteo)
+        :return: nombre de stations ajoutées à la table
+        """
+        stations = stations.dropna(subset=["latitude", "longitude"]).astype({"id_source": str})
+        cles = pd.Series(list(zip(stations["source"], stations["id_source"])), index=stations.index)
+        nouvelles = stations[~cles.isin(self._par_cle.keys()).to_numpy()].drop_duplicates(["source", "id_source"])
+        if nouvelles.empty:
+            return 0
+
+        lignes = []
+        for s in nouvelles.itertuples(index=False):
+            lat, lon = float(s.latitude), float(s.longitude)
+            id_canonique, score = self._meilleur_site(s.source, s.nom, lat, lon)
+            if id_canonique is None:
+                id_canonique, score = f"S{self._prochain:07d}", 1.0
+                self._prochain += 1
+            self._rattacher(id_canonique, s.source, s.nom, lat, lon)
+            self._par_cle[(s.source, s.id_source)] = id_canonique
+            lignes.append({"id_canonique": id_canonique, "source": s.source, "id_source": s.id_source,
+                           "nom": s.nom if isinstance(s.nom, str) else "", "latitude": lat, "longitude": lon,
+                           "score": round(score, 3)})
+
+        self.table = pd.concat([self.table, pd.DataFrame(lignes, columns=COLONNES)], ignore_index=True) \
+            if not self.table.empty else pd.DataFrame(lignes, columns=COLONNES)
+        return len(lignes)
+
+    def sauvegarder(self):
+        os.makedirs(os.path.dirname(self.chemin), exist_ok=True)
+        tmp = self.chemin + ".tmp"
+        self.table.to_csv(tmp, index=False)
+        os.replace(tmp, self.chemin)
+
+    # --- Recherches en aval ---
+
+    def id_canonique(self, source, id_source):
+        """Identifiant canonique d'une station (None si inconnue)."""
+        return self._par_cle.get((source, str(id_source)))
+
+    def ajouter_id_canonique(self, df, source, colonne_id):
+        """
+        Ajoute la colonne id_canonique à un DataFrame d'une source (jointure par clé, sans rapprochement flou).
+
+        :param df: DataFrame de mesures (ex : colonne location_id pour OpenAQ, idx pour AQICN)
+        :param source: "openaq", "aqicn" ou "open_meteo"
+        :param colonne_id: colonne contenant l'identifiant de la station dans la source
+        """
+        correspondance = self.table.loc[self.table["source"] == source].set_index("id_source")["id_canonique"]
+        return df.assign(id_canonique=df[colonne_id].astype(str).map(correspondance))
+
+    def sites_multi_sources(self):
+        """Sites décrits par plusieurs sources : id_canonique, nombre de sources, sources."""
+        groupes = self.table.groupby("id_canonique")["source"]
+        resume = pd.DataFrame({"nb_sources": groupes.nunique(), "sources": groupes.agg(lambda s: ",".join(sorted(s)))})
+        return resume[resume["nb_sources"] > 1].reset_index()
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "EXTRACT"))
+    import requests
+    from registre_openaq import get_registre
+    from sondage_temps_reel import ZONE_EUROPE
+    from grille_pays import charger_bbox, grille_pays
+
+    # Usage : python resolution_stations.py FR DE IT ...
+    codes = sys.argv[1:] or ["FR"]
+    resolveur = ResolveurStations()
+
+    registre = get_registre()
+    for code in codes:
+        ajoutees = resolveur.resoudre(depuis_openaq(registre.capteurs(code, "pm25")))
+        print(f"OpenAQ {code} : {ajoutees} nouvelles stations")
+
+    token = os.getenv("WAQI_TOKEN")
+    if token:
+        resp = requests.get("https://api.waqi.info/map/bounds/",
+                            params={"token": token, "latlng": ",".join(map(str, ZONE_EUROPE))}, timeout=60)
+        if resp.status_code == 200 and resp.json().get("status") == "ok":
+            print(f"AQICN : {resolveur.resoudre(depuis_aqicn(resp.json()['data']))} nouvelles stations")
+        else:
+            print(f"⚠️  Erreur API AQICN {resp.status_code}")
+
+    print(f"Open-Meteo : {resolveur.resoudre(depuis_open_meteo(grille_pays(charger_bbox())))} nouveaux points")
+
+    resolveur.sauvegarder()
+    print(f"✅ {len(resolveur.table)} stations, {resolveur.table['id_canonique'].nunique()} sites, "
+          f"{len(resolveur.sites_multi_sources())} décrits par plusieurs sources → {resolveur.chemin}")
@@ -0,0 +1,362 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+# Dossier des lignes rejetées (sous-dossier : non chargé par LOAD/fichier_un.py)
+dossier_quarantaine = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fichier_csv", "quarantaine")
+
+# Valeurs textuelles considérées comme manquantes
+VALEURS_MANQUANTES = ["", "N/A", "NA", "nan", "NaN", "None", "null"]
+
+# Texte convertible en nombre (équivalent Arrow de pd.to_numeric)
+_NOMBRE = r"^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$|^[-+]?(inf|Inf|INF|infinity|Infinity)$"
+
+# Plages physiquement plausibles par variable (Open-Meteo, OpenAQ, AQICN)
+PLAGES = {
+    "pm2_5": (0, 1000), "pm25": (0, 1000), "iaqi_pm25": (0, 1000),
+    "pm10": (0, 2000), "iaqi_pm10": (0, 2000),
+    "nitrogen_dioxide": (0, 1000), "no2": (0, 1000), "iaqi_no2": (0, 1000),
+    "ozone": (0, 1000), "o3": (0, 1000), "iaqi_o3": (0, 1000),
+    "sulphur_dioxide": (0, 2000), "so2": (0, 2000),
+    "carbon_monoxide": (0, 50000), "co": (0, 50000),
+    "temperature_2m": (-90, 60),
+    "cloudcover": (0, 100),
+    "latitude": (-90, 90), "lat": (-90, 90),
+    "longitude": (-180, 180), "lon": (-180, 180),
+}
+
+
+def _masque(tableau):
+    """Masque booléen Arrow (nuls = pas en échec) → ndarray NumPy."""
+    return pc.fill_null(tableau, False).to_numpy(zero_copy_only=False)
+
+
+def _est_texte(type_arrow):
+    return pa.types.is_string(type_arrow) or pa.types.is_large_string(type_arrow)
+
+
+def _nombres(colonne):
+    """Colonne Arrow en float64 ; texte non numérique → nul (équivalent de pd.to_numeric(errors="coerce"))."""
+    if _est_texte(colonne.type):
+        texte = pc.utf8_trim_whitespace(colonne)
+        texte = pc.if_else(pc.match_substring_regex(texte, _NOMBRE), texte, pa.scalar(None, texte.type))
+        return texte.cast(pa.float64())
+    if pa.types.is_integer(colonne.type) or pa.types.is_floating(colonne.type):
+        return colonne
+    return None
+
+
+def _colonnes(df):
+    return df.column_names if isinstance(df, pa.Table) else list(df.columns)
+
+
+class Regle:
+    """
+    Règle de validation. Une règle de ligne renvoie un masque booléen des lignes en échec ;
+    une règle de tableau renvoie un message d'alerte (ou None).
+    lignes_en_echec_arrow fait le même calcul sur une table Arrow avec les noyaux pyarrow.compute.
+    """
+    code = "REGLE"
+
+    def lignes_en_echec(self, df):
+        return None
+
+    def lignes_en_echec_arrow(self, table):
+        return None
+
+    def alerte(self, df):
+        return None
+
+
+class ColonnesRequises(Regle):
+    code = "COLONNES_REQUISES"
+
+    def __init__(self, colonnes):
+        self.colonnes = list(colonnes)
+
+    def alerte(self, df):
+        manquantes = [c for c in self.colonnes if c not in _colonnes(df)]
+        if manquantes:
+            return f"{self.code}: colonnes absentes {manquantes}"
+        return None
+
+
+class Plage(Regle):
+    """Valeur numérique dans [min, max] (ou ]min, max[ si inclusif=False). Les valeurs nulles passent."""
+
+    def __init__(self, colonne, minimum, maximum, inclusif=True):
+        self.colonne, self.minimum, self.maximum, self.inclusif = colonne, minimum, maximum, inclusif
+        self.code = f"HORS_PLAGE:{colonne}"
+
+    def lignes_en_echec(self, df):
+        v = pd.to_numeric(df[self.colonne], errors="coerce").to_numpy(dtype=float)
+        with np.errstate(invalid="ignore"):
+            if self.inclusif:
+                ok = (v >= self.minimum) & (v <= self.maximum)
+            else:
+                ok = (v > self.minimum) & (v < self.maximum)
+        return ~ok & ~np.isnan(v)
+
+    def lignes_en_echec_arrow(self, table):
+        v = _nombres(table[self.colonne])
+        if v is None:
+            return None
+        # comparaisons fausses pour NaN et nulles pour les nuls : ces valeurs passent, comme en pandas
+        if self.inclusif:
+            hors = pc.or_(pc.less(v, self.minimum), pc.greater(v, self.maximum))
+        else:
+            hors = pc.or_(pc.less_equal(v, self.minimum), pc.greater_equal(v, self.maximum))
+        return _masque(hors)
+
+
+class Numerique(Regle):
+    """Valeur non nulle mais non convertible en nombre."""
+
+    def __init__(self, colonne):
+        self.colonne = colonne
+        self.code = f"NON_NUMERIQUE:{colonne}"
+
+    def lignes_en_echec(self, df):
+        col = df[self.colonne]
+        if pd.api.types.is_numeric_dtype(col):
+            return np.zeros(len(df), dtype=bool)
+        return (pd.to_numeric(col, errors="coerce").isna() & col.notna()).to_numpy()
+
+    def lignes_en_echec_arrow(self, table):
+        col = table[self.colonne]
+        if not _est_texte(col.type):
+            return None
+        nombre = pc.match_substring_regex(pc.utf8_trim_whitespace(col), _NOMBRE)
+        return _masque(pc.invert(nombre))
+
+
+class NonNul(Regle):
+    def __init__(self, colonne):
+        self.colonne = colonne
+        self.code = f"NUL:{colonne}"
+
+    def lignes_en_echec(self, df):
+        return df[self.colonne].isna().to_numpy()
+
+    def lignes_en_echec_arrow(self, table):
+        return _masque(pc.is_null(table[self.colonne], nan_is_null=True))
+
+
+class ClesUniques(Regle):
+    """Doublons sur une clé (la première occurrence est conservée)."""
+
+    def __init__(self, colonnes):
+        self.colonnes = list(colonnes)
+        self.code = f"DOUBLON:{'+'.join(self.colonnes)}"
+
+    def lignes_en_echec(self, df):
+        return df.duplicated(self.colonnes, keep="first").to_numpy()
+
+    def lignes_en_echec_arrow(self, table):
+        # première ligne de chaque clé (nuls regroupés, comme duplicated) : toutes les autres sont en échec
+        cles = table.select(self.colonnes).append_column("__ligne", pa.array(np.arange(table.num_rows)))
+        premieres = cles.group_by(self.colonnes, use_threads=False).aggregate([("__ligne", "min")])
+        echec = np.ones(table.num_rows, dtype=bool)
+        echec[premieres["__ligne_min"].to_numpy()] = False
+        return echec
+
+
+class TempsCroissant(Regle):
+    """
+    Horodatage strictement croissant (par groupe). Les chaînes ISO sont comparées telles quelles,
+    sans conversion en datetime.
+    """
+
+    def __init__(self, colonne="time", par=None):
+        self.colonne, self.par = colonne, par
+        self.code = f"NON_MONOTONE:{colonne}"
+
+    def lignes_en_echec(self, df):
+        t = df[self.colonne]
+        precedent = t.groupby(df[self.par], sort=False).shift() if self.par else t.shift()
+        return (precedent.notna() & t.notna() & (t <= precedent)).to_numpy()
+
+    def lignes_en_echec_arrow(self, table):
+        n = table.num_rows
+        if n < 2:
+            return None
+        # tri stable par groupe : chaque ligne est comparée à la précédente de son groupe
+        if self.par:
+            ordre = pc.sort_indices(table.select([self.par]), sort_keys=[(self.par, "ascending")])
+            groupe = table[self.par].take(ordre)
+            meme_groupe = pc.equal(groupe.slice(1), groupe.slice(0, n - 1))
+        else:
+            ordre = pa.array(np.arange(n))
+            meme_groupe = True
+        t = table[self.colonne].take(ordre)
+        recul = pc.and_(meme_groupe, pc.less_equal(t.slice(1), t.slice(0, n - 1)))
+        echec = np.zeros(n, dtype=bool)
+        echec[ordre.to_numpy()[1:]] = _masque(recul)
+        return echec
+
+
+class RatioNuls(Regle):
+    """Alerte si la proportion de valeurs nulles d'une colonne dépasse un seuil."""
+
+    def __init__(self, colonne, maximum=0.5):
+        self.colonne, self.maximum = colonne, maximum
+        self.code = f"RATIO_NULS:{colonne}"
+
+    def alerte(self, df):
+        if len(df) == 0 or self.colonne not in _colonnes(df):
+            return None
+        if isinstance(df, pa.Table):
+            ratio = pc.sum(pc.is_null(df[self.colonne], nan_is_null=True)).as_py() / df.num_rows
+        else:
+            ratio = df[self.colonne].isna().mean()
+        if ratio > self.maximum:
+            return f"{self.code}: {ratio:.0%} de valeurs nulles (max {self.maximum:.0%})"
+        return None
+
+
+def regles_par_defaut(df):
+    """
+    Règles déduites des colonnes présentes : plages des polluants/météo/coordonnées,
+    unicité et monotonie de (country, time), ratio de nuls des valeurs.
+    """
+    colonnes = _colonnes(df)
+    regles = []
+    for colonne, (mini, maxi) in PLAGES.items():
+        if colonne in colonnes:
+            regles += [Numerique(colonne), Plage(colonne, mini, maxi), RatioNuls(colonne)]
+    pays = "country" if "country" in colonnes else "Pays" if "Pays" in colonnes else None
+    if pays:
+        regles.append(NonNul(pays))
+    if "time" in colonnes:
+        cles = [pays, "time"] if pays else ["time"]
+        regles += [ClesUniques(cles), TempsCroissant("time", par=pays)]
+    elif pays and "month" in colonnes:
+        regles.append(ClesUniques([pays, "month"]))
+    for colonne in colonnes:
+        if colonne.endswith("_moyenne"):
+            regles += [Numerique(colonne), RatioNuls(colonne)]
+    return regles
+
+
+def valider(df, regles=None, nom=None, ecrire_quarantaine=True):
+    """
+    Applique des règles vectorisées à un DataFrame et isole les lignes en échec.
+
+    :param df: DataFrame à valider
+    :param regles: liste de Regle (par défaut : regles_par_defaut(df))
+    :param nom: nom du dataset, utilisé pour le fichier de quarantaine
+    :param ecrire_quarantaine: écrit les lignes rejetées dans fichier_csv/quarantaine/<nom>.csv
+    :return: (lignes valides, lignes en quarantaine avec colonne "raison", rapport)
+    """
+    texte = df.select_dtypes(include=["object", "string"]).columns
+    if len(texte):
+        df = df.assign(**{c: df[c].replace(VALEURS_MANQUANTES, np.nan) for c in texte})
+    if regles is None:
+        regles = regles_par_defaut(df)
+
+    echec, alertes, masques, raisons = _appliquer(df, regles, nom, arrow=False)
+    quarantaine = df[echec].assign(raison=raisons)
+    valides = df[~echec]
+    return valides, quarantaine, _rapport(len(df), len(valides), alertes, masques, quarantaine, nom,
+                                          ecrire_quarantaine)
+
+
+def valider_arrow(table, regles=None, nom=None, ecrire_quarantaine=True):
+    """
+    Valide une table Arrow avec les mêmes règles que valider, sans conversion pandas : les masques sont
+    calculés par pyarrow.compute sur les colonnes de la table et les lignes valides filtrées dans la table,
+    qui garde ses types Arrow. Seules les lignes en quarantaine sont converties (pour le CSV de quarantaine).
+
+    :return: (table Arrow des lignes valides, lignes en quarantaine (DataFrame), rapport)
+    """
+    manquants = pa.array(VALEURS_MANQUANTES)
+    for i, champ in enumerate(table.schema):
+        if _est_texte(champ.type):
+            colonne = table.column(i)
+            table = table.set_column(i, champ, pc.if_else(pc.is_in(colonne, value_set=manquants),
+                                                          pa.scalar(None, champ.type), colonne))
+    if regles is None:
+        regles = regles_par_defaut(table)
+
+    echec, alertes, masques, raisons = _appliquer(table, regles, nom, arrow=True)
+    quarantaine = table.filter(echec).to_pandas().assign(raison=raisons)
+    valides = table.filter(~echec)
+    return valides, quarantaine, _rapport(table.num_rows, valides.num_rows, alertes, masques, quarantaine, nom,
+                                          ecrire_quarantaine)
+
+
+def _appliquer(donnees, regles, nom, arrow):
+    """Évalue les règles ; renvoie (masque des lignes en échec, alertes, masques par code, raisons de rejet)."""
+    alertes = [a for a in (r.alerte(donnees) for r in regles) if a]
+    manquantes = [a for a in alertes if a.startswith(ColonnesRequises.code)]
+    if manquantes:
+        raise ValueError(f"Validation impossible pour {nom or 'dataset'} : {manquantes[0]}")
+
+    echec = np.zeros(len(donnees), dtype=bool)
+    masques = []
+    for r in regles:
+        masque = r.lignes_en_echec_arrow(donnees) if arrow else r.lignes_en_echec(donnees)
+        if masque is not None and masque.any():
+            masques.append((r.code, masque))
+            echec |= masque
+
+    # Codes de rejet construits uniquement pour les lignes en échec
+    raisons = np.full(int(echec.sum()), "", dtype=object)
+    for code, masque in masques:
+        sous_masque = masque[echec]
+        raisons[sous_masque] += code + ";"
+    return echec, alertes, masques, [r.rstrip(";") for r in raisons]
+
+
+def _rapport(lignes, valides, alertes, masques, quarantaine, nom, ecrire_quarantaine):
+    if nom and ecrire_quarantaine and len(quarantaine):
+        os.makedirs(dossier_quarantaine, exist_ok=True)
+        chemin = os.path.join(dossier_quarantaine, f"{nom}.csv")
+        quarantaine.to_csv(chemin, index=False)
+    return {
+        "lignes": lignes,
+        "valides": valides,
+        "quarantaine": len(quarantaine),
+        "codes": {code: int(m.sum()) for code, m in masques},
+        "alertes": alertes,
+    }
+
+
+def afficher_rapport(nom, rapport):
+    """Résumé lisible d'un rapport de validation."""
+    print(f"🔎 Validation {nom} : {rapport['valides']}/{rapport['lignes']} lignes valides, "
+          f"{rapport['quarantaine']} en quarantaine")
+    for code, n in rapport["codes"].items():
+        print(f"   • {code} : {n}")
+    for alerte in rapport["alertes"]:
+        print(f"   ⚠️  {alerte}")
+
+
+def lire_csv(chemin, nom=None):
+    """
+    Lit un CSV sans perdre silencieusement les lignes malformées (contrairement à on_bad_lines='skip') :
+    elles sont écrites en quarantaine avec le code LIGNE_MALFORMEE.
+    Le moteur C rapide est utilisé tant que le fichier est bien formé.
+    """
+    try:
+        return pd.read_csv(chemin)
+    except pd.errors.ParserError:
+        pass
+
+    malformees = []
+
+    def garder(ligne):
+        malformees.append(",".join(ligne))
+        return None
+
+    df = pd.read_csv(chemin, engine="python", on_bad_lines=garder)
+    print(f"⚠️  {len(malformees)} lignes malformées dans {chemin}")
+    if nom and malformees:
+        os.makedirs(dossier_quarantaine, exist_ok=True)
+        pd.DataFrame({"ligne": malformees, "raison": "LIGNE_MALFORMEE"}).to_csv(
+            os.path.join(dossier_quarantaine, f"{nom}_lignes_malformees.csv"), index=False)
+    return df
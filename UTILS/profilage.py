@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import threading
+import functools
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+dossier_profils = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fichier_csv", "profils")
+
+# Seuil de régression signalé par comparer_au_precedent (+20 % de temps mural)
+SEUIL_REGRESSION = 0.20
+
+
+def _rss_max_mo():
+    """RSS maximal du processus en Mo (0 si indisponible)."""
+    if resource is None:
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+class Mesure:
+    """Objet renvoyé par Profileur.etape : permet de renseigner le nombre de lignes traitées."""
+
+    def __init__(self):
+        self.lignes = None
+
+
+class EchantillonneurPile(threading.Thread):
+    """
+    Profileur par échantillonnage : relève la pile du thread principal toutes les `intervalle` secondes.
+    Les piles sont agrégées au format "collapsed" (f1;f2;f3 N) lisible par flamegraph.pl / speedscope.
+    """
+
+    def __init__(self, intervalle=0.005):
+        super().__init__(daemon=True)
+        self.intervalle = intervalle
+        self.cible = threading.main_thread().ident
+        self.piles = Counter()
+        self._arret = threading.Event()
+
+    def run(self):
+        while not self._arret.wait(self.intervalle):
+            frame = sys._current_frames().get(self.cible)
+            pile = []
+            while frame is not None:
+                code = frame.f_code
+                pile.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if pile:
+                self.piles[";".join(reversed(pile))] += 1
+
+    def arreter(self):
+        self._arret.set()
+        self.join()
+
+    def exporter(self, chemin):
+        with open(chemin, "w", encoding="utf-8") as f:
+            for pile, n in self.piles.most_common():
+                f.write(f"{pile} {n}\n")
+
+
+class Profileur:
+    """
+    Mesure des étapes nommées d'un pipeline : temps mural, temps CPU, lignes traitées et
+    pic mémoire (tracemalloc si activé, sinon RSS maximal du processus).
+
+    Les étapes de même nom sont cumulées (ex : "requete" appelée une fois par pays).
+    """
+
+    def __init__(self, nom, tracemalloc_actif=False, echantillonnage=False):
+        self.nom = nom
+        self.debut = datetime.now().isoformat(timespec="seconds")
+        self.etapes = {}
+        self._pile = []
+        self.tracemalloc_actif = tracemalloc_actif
+        if tracemalloc_actif and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.echantillonneur = None
+        if echantillonnage:
+            self.echantillonneur = EchantillonneurPile()
+            self.echantillonneur.start()
+
+    @contextmanager
+    def etape(self, nom, lignes=None):
+        """
+        Contexte mesurant une étape.
+
+            with profileur.etape("dataframe") as m:
+                df = pd.DataFrame(...)
+                m.lignes = len(df)
+        """
+        mesure = Mesure()
+        mesure.lignes = lignes
+        if self.tracemalloc_actif:
+            # le pic de l'étape englobante est mémorisé avant la remise à zéro
+            if self._pile:
+                self._pile[-1][1] = max(self._pile[-1][1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._pile.append([nom, 0])
+        t0, c0 = time.perf_counter(), time.process_time()
+        try:
+            yield mesure
+        finally:
+            duree, cpu = time.perf_counter() - t0, time.process_time() - c0
+            _, pic_enfants = self._pile.pop()
+            if self.tracemalloc_actif:
+                pic = max(tracemalloc.get_traced_memory()[1], pic_enfants) / 1024 / 1024
+                if self._pile:
+                    self._pile[-1][1] = max(self._pile[-1][1], pic * 1024 * 1024)
+            else:
+                pic = _rss_max_mo()
+
+            e = self.etapes.setdefault(nom, {"appels": 0, "duree_s": 0.0, "cpu_s": 0.0, "lignes": 0,
+                                             "pic_memoire_mo": 0.0})
+            e["appels"] += 1
+            e["duree_s"] += duree
+            e["cpu_s"] += cpu
+            e["lignes"] += mesure.lignes or 0
+            e["pic_memoire_mo"] = max(e["pic_memoire_mo"], pic)
+
+    def profiler(self, nom=None):
+        """Décorateur : mesure chaque appel de la fonction (lignes = len() du résultat si possible)."""
+        def decorateur(fonction):
+            @functools.wraps(fonction)
+            def enveloppe(*args, **kwargs):
+                with self.etape(nom or fonction.__name__) as m:
+                    resultat = fonction(*args, **kwargs)
+                    try:
+                        m.lignes = len(resultat)
+                    except TypeError:
+                        pass
+                    return resultat
+            return enveloppe
+        return decorateur
+
+    # --- Export ---
+
+    def resultats(self):
+        return {"pipeline": self.nom, "debut": self.debut, "etapes": self.etapes}
+
+    def exporter_json(self, chemin=None):
+        """Ajoute le run à l'historique JSON Lines du pipeline (un run par ligne)."""
+        chemin = chemin or os.path.join(dossier_profils, f"{self.nom}.jsonl")
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        with open(chemin, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.resultats(), ensure_ascii=False) + "\n")
+        return chemin
+
+    def exporter_prometheus(self, chemin=None):
+        """Écrit les mesures au format texte Prometheus (collecteur textfile de node_exporter)."""
+        chemin = chemin or os.path.join(dossier_profils, f"{self.nom}.prom")
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        metriques = {
+            "duree_s": ("pipeline_etape_duree_secondes", "Temps mural cumulé de l'étape"),
+            "cpu_s": ("pipeline_etape_cpu_secondes", "Temps CPU cumulé de l'étape"),
+            "lignes": ("pipeline_etape_lignes", "Lignes traitées par l'étape"),
+            "appels": ("pipeline_etape_appels", "Nombre d'exécutions de l'étape"),
+            "pic_memoire_mo": ("pipeline_etape_pic_memoire_mo", "Pic mémoire de l'étape (Mo)"),
+        }
+        lignes = []
+        for cle, (metrique, aide) in metriques.items():
+            lignes += [f"# HELP {metrique} {aide}", f"# TYPE {metrique} gauge"]
+            for etape, e in self.etapes.items():
+                lignes.append(f'{metrique}{{pipeline="{self.nom}",etape="{etape}"}} {e[cle]}')
+        with open(chemin, "w", encoding="utf-8") as f:
+            f.write("\n".join(lignes) + "\n")
+        return chemin
+
+    def comparer_au_precedent(self, chemin=None):
+        """Compare les durées au run précédent de l'historique et renvoie les étapes en régression."""
+        chemin = chemin or os.path.join(dossier_profils, f"{self.nom}.jsonl")
+        if not os.path.exists(chemin):
+            return {}
+        with open(chemin, encoding="utf-8") as f:
+            runs = [json.loads(l) for l in f if l.strip()]
+        precedents = [r for r in runs if r["debut"] != self.debut]
+        if not precedents:
+            return {}
+        avant = precedents[-1]["etapes"]
+        regressions = {}
+        for nom, e in self.etapes.items():
+            if nom in avant and avant[nom]["duree_s"] > 0:
+                variation = e["duree_s"] / avant[nom]["duree_s"] - 1
+                if variation > SEUIL_REGRESSION:
+                    regressions[nom] = variation
+        return regressions
+
+    def rapport(self, exporter=True):
+        """Affiche le tableau des étapes, exporte JSON/Prometheus (+ piles échantillonnées) et signale les régressions."""
+        print(f"\n⏱️  Profil {self.nom}")
+        print(f"   {'étape':<20} {'appels':>7} {'mural (s)':>10} {'CPU (s)':>9} {'lignes':>10} {'pic (Mo)':>9}")
+        for nom, e in sorted(self.etapes.items(), key=lambda x: -x[1]["duree_s"]):
+            print(f"   {nom:<20} {e['appels']:>7} {e['duree_s']:>10.3f} {e['cpu_s']:>9.3f} "
+                  f"{e['lignes']:>10} {e['pic_memoire_mo']:>9.1f}")
+        if not exporter:
+            return
+        if self.echantillonneur is not None:
+            self.echantillonneur.arreter()
+            chemin = os.path.join(dossier_profils, f"{self.nom}_{self.debut.replace(':', '')}.collapsed")
+            os.makedirs(dossier_profils, exist_ok=True)
+            self.echantillonneur.exporter(chemin)
+            print(f"   🔥 Piles échantillonnées : {chemin}")
+        regressions = self.comparer_au_precedent()
+        self.exporter_json()
+        self.exporter_prometheus()
+        for nom, variation in regressions.items():
+            print(f"   ⚠️  Régression {nom} : +{variation:.0%} par rapport au run précédent")
+
+
+def profileur_depuis_env(nom):
+    """
+    Profileur configuré par variables d'environnement :
+    PROFILAGE_MEMOIRE=1 active tracemalloc, PROFILAGE_ECHANTILLONNAGE=1 active les piles échantillonnées.
+    """
+    return Profileur(nom,
+                     tracemalloc_actif=os.getenv("PROFILAGE_MEMOIRE") == "1",
+                     echantillonnage=os.getenv("PROFILAGE_ECHANTILLONNAGE") == "1")
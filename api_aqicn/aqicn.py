@@ -114,7 +114,10 @@ def recuperer_aqi_pour_villes_detail(all_stations, token, output_csv):
                     for p in polluants:
                         ligne[f'iaqi_{p}'] = iaqi.get(p, {}).get('v')
 
-                    # Prévisions PM2.5 pour 2 jours max
+                    # Prévisions PM2.5 pour 2 jours max, à partir du lendemain du relevé : WAQI fait commencer
+                    # forecast.daily.pm25 quelques jours avant, ces entrées-là sont déjà observées
+                    jour_releve = (time_data.get('s') or '')[:10]
+                    forecast_pm25 = [day for day in forecast_pm25 if (day.get('day') or '') > jour_releve]
                     for day_index in range(2):
                         if day_index < len(forecast_pm25):
                             day = forecast_pm25[day_index]